@@ -1,9 +1,13 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import openai
 import requests
 import base64
-import json
+import time
+from metrics import metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from voicestream import stream_reply, encode_frame
+from vulnindex import IndexCache, TOP_K
+from replycache import ReplyCache, AudioCache
 
 
 app = Flask(__name__)
@@ -13,14 +17,35 @@ CORS(app)
 DEEPGRAM_API_KEY = ""
 OPENAI_API_KEY = ""
 client = openai.OpenAI(api_key=OPENAI_API_KEY)
+vulnerability_indexes = IndexCache()
+# Set to a directory (e.g. ".cache/voice") to keep cached replies and TTS
+# audio on disk, shared between gunicorn workers and across restarts.
+VOICE_CACHE_DIR = None
+reply_cache = ReplyCache(VOICE_CACHE_DIR)
+audio_cache = AudioCache(VOICE_CACHE_DIR)
 
 @app.route('/', methods=['GET'])
 def home():
     return jsonify({"message": "✅ Voice Assistant API is up and running!"}), 200
 
 
-def deepgram_tts(text, api_key):
-    url = "https://api.deepgram.com/v1/speak?model=aura-2-thalia-en"
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype=METRICS_CONTENT_TYPE)
+
+
+deepgram_session = requests.Session()
+
+
+TTS_VOICE = "aura-2-thalia-en"
+
+
+def deepgram_tts_audio(text, api_key):
+    audio = audio_cache.get(text, TTS_VOICE)
+    if audio is not None:
+        return audio, None
+
+    url = f"https://api.deepgram.com/v1/speak?model={TTS_VOICE}"
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Token {api_key}"
@@ -29,47 +54,69 @@ def deepgram_tts(text, api_key):
         "text": text
     }
 
-    response = requests.post(url, headers=headers, json=payload)
+    with metrics.span("guardex_upstream_seconds", provider="deepgram", operation="tts"):
+        response = deepgram_session.post(url, headers=headers, json=payload)
     
     if response.status_code != 200:
+        metrics.inc("guardex_upstream_errors_total", provider="deepgram", operation="tts")
         return None, response.text
 
-    audio_base64 = base64.b64encode(response.content).decode("utf-8")
+    metrics.inc("guardex_bytes_total", len(response.content), kind="audio_out")
+    audio_cache.put(text, TTS_VOICE, response.content)
+    return response.content, None
+
+
+def deepgram_tts(text, api_key):
+    audio, error = deepgram_tts_audio(text, api_key)
+    if error:
+        return None, error
+
+    audio_base64 = base64.b64encode(audio).decode("utf-8")
     return audio_base64, None
 
-@app.route("/api/voice-agent", methods=["POST"])
-def handle_audio():
+
+def parse_voice_request():
+    # Returns (audio_bytes, mimetype, vulnerability index, None) or an error response.
     if "audio" not in request.files:
-        return jsonify({"error": "Missing audio file"}), 400
+        return None, None, None, (jsonify({"error": "Missing audio file"}), 400)
 
     if not request.form.get("vulnerabilities"):
-        return jsonify({"error": "Missing vulnerability data"}), 400
+        return None, None, None, (jsonify({"error": "Missing vulnerability data"}), 400)
 
     try:
-        # Parse vulnerability JSON string from form-data
-        vulnerabilities_json = json.loads(request.form.get("vulnerabilities"))
+        # Parse and index the vulnerability JSON string from form-data; the
+        # same scan's follow-up questions reuse the cached index.
+        vulnerability_index = vulnerability_indexes.get(request.form.get("vulnerabilities"))
     except Exception as e:
-        return jsonify({"error": "Invalid vulnerability JSON"}), 400
+        return None, None, None, (jsonify({"error": "Invalid vulnerability JSON"}), 400)
 
     audio_file = request.files["audio"]
     audio_bytes = audio_file.read()
+    metrics.inc("guardex_bytes_total", len(audio_bytes), kind="audio_in")
+    return audio_bytes, audio_file.mimetype, vulnerability_index, None
 
-    transcript_resp = requests.post(
-        "https://api.deepgram.com/v1/listen?model=nova-3&smart_format=true",
-        headers={
-            "Authorization": f"Token {DEEPGRAM_API_KEY}",
-            "Content-Type": audio_file.mimetype
-        },
-        data=audio_bytes
-    )
+
+def transcribe(audio_bytes, mimetype, timings):
+    # Returns (transcription, None) or (None, error response).
+    with metrics.span("guardex_stage_seconds", timings, stage="stt"), \
+            metrics.span("guardex_upstream_seconds", provider="deepgram", operation="stt"):
+        transcript_resp = deepgram_session.post(
+            "https://api.deepgram.com/v1/listen?model=nova-3&smart_format=true",
+            headers={
+                "Authorization": f"Token {DEEPGRAM_API_KEY}",
+                "Content-Type": mimetype
+            },
+            data=audio_bytes
+        )
 
     try:
         transcript_resp.raise_for_status()
     except requests.exceptions.RequestException:
-        return jsonify({
+        metrics.inc("guardex_upstream_errors_total", provider="deepgram", operation="stt")
+        return None, (jsonify({
             "error": "Deepgram failed to process audio",
             "details": transcript_resp.text
-        }), 500
+        }), 500)
 
     transcription = (
         transcript_resp.json()
@@ -80,13 +127,20 @@ def handle_audio():
     )
 
     if not transcription:
-        return jsonify({"error": "Could not transcribe audio"}), 500
+        return None, (jsonify({"error": "Could not transcribe audio"}), 500)
+    return transcription, None
 
-    # Convert vulnerability data to text for the prompt
+
+def build_messages(transcription, vulnerability_index):
+    # Convert the findings most relevant to the question to text for the prompt
+    relevant = vulnerability_index.search(transcription, TOP_K)
+    metrics.inc("guardex_prompt_findings_total", len(relevant))
     vuln_text = "\n\n".join([
         f"- {v.get('name')} ({v.get('severity')}): {v.get('description')}"
-        for v in vulnerabilities_json
+        for v in relevant
     ])
+    if len(relevant) < len(vulnerability_index):
+        vuln_text += f"\n\n(The {len(relevant)} findings most relevant to the question, out of {len(vulnerability_index)} in the scan.)"
 
     prompt = f"""
 You are a security expert AI assistant. The user asked: "{transcription}"
@@ -108,27 +162,133 @@ VULNERABILITY DATA:
 {vuln_text}
 """
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": transcription}
-        ],
-        max_tokens=200,
-        temperature=0.5
-    )
+    return [
+        {"role": "system", "content": prompt},
+        {"role": "user", "content": transcription}
+    ]
 
-    reply_text = response.choices[0].message.content
 
-    audio_base64, error = deepgram_tts(reply_text, DEEPGRAM_API_KEY)
+def record_usage(usage):
+    if usage:
+        metrics.inc("guardex_llm_tokens_total", usage.prompt_tokens, provider="openai", kind="prompt")
+        metrics.inc("guardex_llm_tokens_total", usage.completion_tokens, provider="openai", kind="completion")
+
+
+def stream_completion(messages):
+    with metrics.span("guardex_upstream_seconds", provider="openai", model="gpt-4o"):
+        stream = client.chat.completions.create(
+            model="gpt-4o",
+            messages=messages,
+            max_tokens=200,
+            temperature=0.5,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        for chunk in stream:
+            if chunk.usage:
+                record_usage(chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+@app.route("/api/voice-agent", methods=["POST"])
+def handle_audio():
+    audio_bytes, mimetype, vulnerability_index, error_response = parse_voice_request()
+    if error_response:
+        return error_response
+
+    started = time.monotonic()
+    timings = {}
+    transcription, error_response = transcribe(audio_bytes, mimetype, timings)
+    if error_response:
+        return error_response
+
+    cache_key = reply_cache.key(transcription, vulnerability_index)
+    reply_text = reply_cache.get(cache_key)
+    if reply_text is None:
+        with metrics.span("guardex_stage_seconds", timings, stage="llm"), \
+                metrics.span("guardex_upstream_seconds", provider="openai", model="gpt-4o"):
+            response = client.chat.completions.create(
+                model="gpt-4o",
+                messages=build_messages(transcription, vulnerability_index),
+                max_tokens=200,
+                temperature=0.5
+            )
+
+        record_usage(response.usage)
+        reply_text = response.choices[0].message.content
+        reply_cache.put(cache_key, reply_text)
+
+    with metrics.span("guardex_stage_seconds", timings, stage="tts"):
+        audio_base64, error = deepgram_tts(reply_text, DEEPGRAM_API_KEY)
     if error:
         return jsonify({"error": "TTS failed", "details": error}), 500
 
+    timings["total"] = time.monotonic() - started
+    metrics.observe("guardex_voice_request_seconds", timings["total"])
+
     return jsonify({
         "transcription": transcription,
         "response_text": reply_text,
-        "response_audio_base64": audio_base64
+        "response_audio_base64": audio_base64,
+        "timings": {stage: round(seconds, 3) for stage, seconds in timings.items()}
     })
 
+
+@app.route("/api/voice-agent/stream", methods=["POST"])
+def handle_audio_stream():
+    # Same request as /api/voice-agent, but the reply is streamed as framed
+    # binary (see voicestream.py) so audio starts after the first sentence.
+    audio_bytes, mimetype, vulnerability_index, error_response = parse_voice_request()
+    if error_response:
+        return error_response
+
+    started = time.monotonic()
+    timings = {}
+    transcription, error_response = transcribe(audio_bytes, mimetype, timings)
+    if error_response:
+        return error_response
+
+    def synthesize(sentence):
+        return deepgram_tts_audio(sentence, DEEPGRAM_API_KEY)
+
+    def reply_tokens():
+        # A cached reply is replayed as a single delta; a fresh one is cached
+        # once the completion has streamed through in full.
+        cache_key = reply_cache.key(transcription, vulnerability_index)
+        reply_text = reply_cache.get(cache_key)
+        if reply_text is not None:
+            yield reply_text
+            return
+        parts = []
+        for delta in stream_completion(build_messages(transcription, vulnerability_index)):
+            parts.append(delta)
+            yield delta
+        reply_cache.put(cache_key, "".join(parts))
+
+    def generate():
+        try:
+            yield from stream_reply(
+                transcription,
+                reply_tokens(),
+                synthesize,
+                timings,
+                started,
+            )
+        except Exception as e:
+            print("Streaming voice reply failed:", e)
+            yield encode_frame(b"E", {"error": "Streaming failed", "details": str(e)})
+        finally:
+            if "total" in timings:
+                metrics.observe("guardex_voice_request_seconds", timings["total"])
+            if "first_audio" in timings:
+                metrics.observe("guardex_voice_first_audio_seconds", timings["first_audio"])
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/octet-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5001, debug=True)
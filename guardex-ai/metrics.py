@@ -0,0 +1,139 @@
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class StageTimings:
+    # Per-scan breakdown for stages that run on many threads at once (LLM
+    # calls, fetches). wall is first start to last end, so it can be read
+    # against the scan's total; busy is summed over threads and can exceed
+    # it.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+
+    def add(self, stage, started, ended):
+        with self.lock:
+            first, last, busy = self.stages.get(stage, (started, ended, 0.0))
+            self.stages[stage] = (min(first, started), max(last, ended), busy + ended - started)
+
+    def report(self):
+        with self.lock:
+            return {
+                stage: {"wall": round(last - first, 3), "busy": round(busy, 3)}
+                for stage, (first, last, busy) in self.stages.items()
+            }
+
+
+class Metrics:
+    # Process-wide counters and latency histograms rendered in Prometheus
+    # text format. Worker processes drain() their deltas and ship them to
+    # the web process, which merge()s them before serving /metrics.
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[0][i] += 1
+                    break
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    @contextmanager
+    def span(self, name, timings=None, **labels):
+        # Times the block into histogram `name`; if timings is given the
+        # block is also recorded there under the first label's value, which
+        # builds a per-request breakdown alongside the global histograms. A
+        # plain dict sums the seconds (cumulative, right for sequential
+        # stages); a StageTimings also keeps wall time for concurrent ones.
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            ended = time.monotonic()
+            self.observe(name, ended - started, **labels)
+            if timings is not None:
+                stage = next(iter(labels.values()), name)
+                if isinstance(timings, StageTimings):
+                    timings.add(stage, started, ended)
+                else:
+                    with self.lock:
+                        timings[stage] = timings.get(stage, 0.0) + ended - started
+
+    def drain(self):
+        with self.lock:
+            delta = {"counters": self.counters, "histograms": self.histograms}
+            self.counters, self.histograms = {}, {}
+        return delta
+
+    def merge(self, delta):
+        with self.lock:
+            for key, value in delta["counters"].items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, (counts, total, count) in delta["histograms"].items():
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+                histogram[0] = [a + b for a, b in zip(histogram[0], counts)]
+                histogram[1] += total
+                histogram[2] += count
+
+    def render(self):
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: (list(h[0]), h[1], h[2]) for key, h in self.histograms.items()}
+
+        lines = []
+        typed = set()
+        for (name, labels), value in sorted(counters.items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{format_labels(labels)} {value}")
+
+        for (name, labels), (counts, total, count) in sorted(histograms.items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{format_labels(labels, [('le', str(bound))])} {cumulative}")
+            lines.append(f"{name}_bucket{format_labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from metrics import metrics
+
+REPLY_CACHE_ENTRIES = 2048
+REPLY_CACHE_BYTES = 4 * 1024 * 1024
+AUDIO_CACHE_ENTRIES = 512
+AUDIO_CACHE_BYTES = 64 * 1024 * 1024
+QUESTION_NOISE = re.compile(r"[^\w\s]+")
+
+
+def normalize_question(transcription):
+    # "What's the most critical issue?" and "whats the most critical issue"
+    # are the same question.
+    text = QUESTION_NOISE.sub("", transcription.lower())
+    return " ".join(text.split())
+
+
+class TieredCache:
+    # Byte-valued LRU bounded by entry count and total size, with an
+    # optional directory behind it so entries survive restarts and are
+    # shared between gunicorn workers. Disk hits are promoted to memory.
+
+    def __init__(self, name, max_entries, max_bytes, disk_dir=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+                metrics.inc("guardex_cache_total", cache=self.name, result="hit")
+                return value
+
+        if self.disk_dir:
+            try:
+                with open(self.disk_path(key), "rb") as f:
+                    value = f.read()
+            except OSError:
+                value = None
+            if value is not None:
+                metrics.inc("guardex_cache_total", cache=self.name, result="disk_hit")
+                self.remember(key, value)
+                return value
+
+        metrics.inc("guardex_cache_total", cache=self.name, result="miss")
+        return None
+
+    def put(self, key, value):
+        self.remember(key, value)
+        if self.disk_dir:
+            self.write_disk(key, value)
+
+    def remember(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.entries[key] = value
+            self.size += len(value)
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def write_disk(self, key, value):
+        # Write to a temp file and rename so readers never see partial data.
+        path = self.disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not write {self.name} cache entry:", e)
+
+
+class ReplyCache:
+    # reply_text per (normalized question, vulnerability set).
+
+    def __init__(self, disk_dir=None):
+        self.cache = TieredCache(
+            "reply", REPLY_CACHE_ENTRIES, REPLY_CACHE_BYTES,
+            os.path.join(disk_dir, "replies") if disk_dir else None,
+        )
+
+    def key(self, transcription, vulnerability_index):
+        question = normalize_question(transcription)
+        return hashlib.sha256(f"{vulnerability_index.key}\0{question}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        value = self.cache.get(key)
+        return value.decode("utf-8") if value is not None else None
+
+    def put(self, key, reply_text):
+        if reply_text:
+            self.cache.put(key, reply_text.encode("utf-8"))
+
+
+class AudioCache:
+    # Content-addressed TTS audio: the same text with the same voice always
+    # synthesizes to the same MP3, whichever question produced it.
+
+    def __init__(self, disk_dir=None):
+        self.cache = TieredCache(
+            "tts_audio", AUDIO_CACHE_ENTRIES, AUDIO_CACHE_BYTES,
+            os.path.join(disk_dir, "audio") if disk_dir else None,
+        )
+
+    def key(self, text, voice):
+        return hashlib.sha256(f"{voice}\0{text.strip()}".encode("utf-8")).hexdigest()
+
+    def get(self, text, voice):
+        return self.cache.get(self.key(text, voice))
+
+    def put(self, text, voice, audio):
+        if audio:
+            self.cache.put(self.key(text, voice), audio)
@@ -0,0 +1,93 @@
+import json
+import re
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Wire format of /api/voice-agent/stream: a sequence of frames, each a
+# 1-byte type, a 4-byte big-endian payload length and the payload.
+#   T  transcription (UTF-8 text)
+#   X  reply text delta (UTF-8 text)
+#   A  MP3 audio for the next sentence, in reply order (binary)
+#   E  error (JSON)
+#   D  done, with per-stage timings (JSON)
+FRAME_HEADER = struct.Struct(">cI")
+TTS_WORKERS = 4
+MIN_SENTENCE_CHARS = 12
+SENTENCE_END = re.compile(r"[.!?…]+[\"')\]]*\s+|\n+")
+
+
+def encode_frame(kind, payload):
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    elif not isinstance(payload, bytes):
+        payload = json.dumps(payload).encode("utf-8")
+    return FRAME_HEADER.pack(kind, len(payload)) + payload
+
+
+class SentenceSplitter:
+    # Buffers streamed tokens and hands back complete sentences. Very short
+    # fragments ("Hi.") are held until the next sentence so TTS requests
+    # stay worth their round trip.
+
+    def __init__(self, min_chars=MIN_SENTENCE_CHARS):
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    def feed(self, text):
+        self.buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self.buffer):
+            if match.end() - start >= self.min_chars:
+                sentences.append(self.buffer[start:match.end()].strip())
+                start = match.end()
+        self.buffer = self.buffer[start:]
+        return [sentence for sentence in sentences if sentence]
+
+    def flush(self):
+        rest, self.buffer = self.buffer.strip(), ""
+        return [rest] if rest else []
+
+
+def stream_reply(transcription, token_stream, synthesize, timings, started):
+    # Yields frames while the LLM is still generating: each finished
+    # sentence goes to a TTS worker straight away and its audio is sent as
+    # soon as it (and every sentence before it) is ready.
+    yield encode_frame(b"T", transcription)
+
+    splitter = SentenceSplitter()
+    pending = []
+    reply = []
+
+    def ready_audio(wait=False):
+        while pending and (wait or pending[0].done()):
+            audio, error = pending.pop(0).result()
+            if error:
+                yield encode_frame(b"E", {"error": "TTS failed", "details": error})
+                continue
+            if "first_audio" not in timings:
+                timings["first_audio"] = time.monotonic() - started
+            yield encode_frame(b"A", audio)
+
+    with ThreadPoolExecutor(max_workers=TTS_WORKERS) as executor:
+        llm_started = time.monotonic()
+        for delta in token_stream:
+            if "first_token" not in timings:
+                timings["first_token"] = time.monotonic() - started
+            reply.append(delta)
+            yield encode_frame(b"X", delta)
+            for sentence in splitter.feed(delta):
+                pending.append(executor.submit(synthesize, sentence))
+            yield from ready_audio()
+        timings["llm"] = time.monotonic() - llm_started
+
+        for sentence in splitter.flush():
+            pending.append(executor.submit(synthesize, sentence))
+        yield from ready_audio(wait=True)
+
+    timings["total"] = time.monotonic() - started
+    yield encode_frame(b"D", {
+        "response_text": "".join(reply),
+        "timings": {stage: round(seconds, 3) for stage, seconds in timings.items()},
+    })
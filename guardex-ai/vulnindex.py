@@ -0,0 +1,128 @@
+import hashlib
+import json
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from metrics import metrics
+
+INDEX_CACHE_SIZE = 64
+TOP_K = 8
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Field weights: a term in the name or type counts for more than one buried
+# in a long description.
+FIELD_WEIGHTS = (("name", 2), ("vulnerability_type", 2), ("vendor", 2), ("description", 1), ("severity", 1))
+SEVERITY_RANK = {"critical": 4, "high": 3, "medium": 2, "low": 1}
+VENDORS = (
+    "firebase", "openai", "stripe", "google", "cloudinary", "github", "vercel", "supabase",
+    "aws", "slack", "sendgrid", "twilio", "mapbox", "algolia", "sentry", "jwt",
+)
+STOPWORDS = {
+    "the", "a", "an", "is", "are", "was", "were", "be", "to", "of", "in", "on", "for", "and", "or",
+    "my", "me", "i", "it", "its", "this", "that", "what", "how", "do", "does", "can", "you", "about",
+    "with", "any", "there", "tell", "please", "should", "which", "why", "we", "our", "your",
+}
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    tokens = []
+    for token in TOKEN_PATTERN.findall(str(text or "").lower()):
+        if len(token) < 2 or token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def detect_vendor(finding):
+    text = " ".join(str(finding.get(field) or "") for field in ("name", "vulnerability_type", "leaked_value")).lower()
+    return " ".join(vendor for vendor in VENDORS if vendor in text)
+
+
+class VulnerabilityIndex:
+    # BM25 over one scan's findings, built once per distinct vulnerability
+    # set. search() returns the top-k findings for a question; questions
+    # that match nothing ("hi", "what should I fix first?") get the most
+    # severe findings instead.
+
+    def __init__(self, vulnerabilities, key=None):
+        self.key = key
+        self.findings = [v for v in vulnerabilities if isinstance(v, dict)]
+        self.documents = []
+        for finding in self.findings:
+            fields = dict(finding, vendor=detect_vendor(finding))
+            counts = Counter()
+            for field, weight in FIELD_WEIGHTS:
+                for token in tokenize(fields.get(field)):
+                    counts[token] += weight
+            self.documents.append(counts)
+        self.lengths = [sum(counts.values()) for counts in self.documents]
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        document_frequency = Counter(token for counts in self.documents for token in counts)
+        total = len(self.documents)
+        self.idf = {
+            token: math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+            for token, frequency in document_frequency.items()
+        }
+
+    def __len__(self):
+        return len(self.findings)
+
+    def severity(self, i):
+        return SEVERITY_RANK.get(str(self.findings[i].get("severity") or "").lower(), 0)
+
+    def score(self, i, terms):
+        counts = self.documents[i]
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[i] / (self.average_length or 1))
+        return sum(
+            self.idf[term] * counts[term] * (BM25_K1 + 1) / (counts[term] + norm)
+            for term in terms if term in counts
+        )
+
+    def search(self, query, k=TOP_K):
+        terms = [term for term in set(tokenize(query)) if term in self.idf]
+        if terms:
+            scored = [(self.score(i, terms), self.severity(i), i) for i in range(len(self.findings))]
+            ranked = [i for score, _, i in sorted(scored, reverse=True) if score > 0]
+        else:
+            ranked = []
+        if len(ranked) < k:
+            chosen = set(ranked)
+            by_severity = sorted(range(len(self.findings)), key=lambda i: -self.severity(i))
+            ranked += [i for i in by_severity if i not in chosen][:k - len(ranked)]
+        return [self.findings[i] for i in ranked[:k]]
+
+
+class IndexCache:
+    # LRU of built indexes keyed by a hash of the raw vulnerabilities JSON,
+    # so follow-up questions about the same scan skip parsing and indexing.
+
+    def __init__(self, max_entries=INDEX_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, vulnerabilities_raw):
+        key = hashlib.sha256(vulnerabilities_raw.encode("utf-8")).hexdigest()
+        with self.lock:
+            index = self.entries.get(key)
+            if index is not None:
+                self.entries.move_to_end(key)
+                metrics.inc("guardex_vuln_index_total", result="hit")
+                return index
+
+        # Raises ValueError for invalid JSON; nothing is cached then.
+        vulnerabilities = json.loads(vulnerabilities_raw)
+        if not isinstance(vulnerabilities, list):
+            raise ValueError("vulnerabilities must be a JSON array")
+        index = VulnerabilityIndex(vulnerabilities, key)
+        metrics.inc("guardex_vuln_index_total", result="miss")
+        with self.lock:
+            self.entries[key] = index
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return index
@@ -1,18 +1,12 @@
-from flask import Flask, request
+from flask import Flask, Response, request
 from flask_socketio import SocketIO, emit
-import httpx
-from jscrawler import JSFileCrawler
-from summarize import summarize_vulnerabilities
-from scanner import (
-    GeminiPool,
-    fetch_js_with_fallback,
-    more_aggressive_filter,
-    split_js_code,
-    create_prompt,
-    extract_json_from_response,
-)
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from supabase import create_client, Client
+from config import (
+    supabase_url, supabase_key, SCAN_PROCESSES, MAX_QUEUED_PER_USER, QUICK_SCAN_SECONDS, QUICK_SCAN_TOKENS,
+)
+from workers import ScanWorkerPool
+from metrics import metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+import scanjob
 import os
 import json
 import threading
@@ -21,157 +15,69 @@ app = Flask(__name__)
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode="threading")
 
 # Supabase client
-supabase_url = ""
-supabase_key = ""
 supabase: Client = create_client(supabase_url, supabase_key)
 
-GEMINI_KEYS = [
-]
+worker_pool = None
+worker_pool_lock = threading.Lock()
+
+
+def get_worker_pool():
+    global worker_pool
+    with worker_pool_lock:
+        if worker_pool is None:
+            if SCAN_PROCESSES:
+                worker_pool = ScanWorkerPool(SCAN_PROCESSES, socketio.emit)
+                worker_pool.start()
+                socketio.start_background_task(worker_pool.relay_events)
+                socketio.start_background_task(worker_pool.monitor)
+            else:
+                scanjob.init_services(socketio.emit)
+                worker_pool = False
+        return worker_pool
+
 
 @socketio.on("start_scan")
 def handle_start_scan(data):
     base_url = data.get("url")
     user_id = data.get("user_id")
+    resume_scan_id = data.get("resume_scan_id")
+    incremental = data.get("incremental", True)
     sid = request.sid  # Capture session ID
 
+    # Quick scans (interactive use) stop at a time/token budget; scheduled
+    # runs leave it off for full coverage.
+    budget = None
+    if data.get("quick") or data.get("time_budget") or data.get("token_budget"):
+        budget = {
+            "seconds": data.get("time_budget") or QUICK_SCAN_SECONDS,
+            "tokens": data.get("token_budget") or QUICK_SCAN_TOKENS,
+        }
+
     if not base_url or not user_id:
         emit("scan_update", {"message": "❌ Missing URL or user_id."}, to=sid)
         return
 
     emit("scan_update", {"message": f"🌐 Starting scan for {base_url}"}, to=sid)
+    emit("scan_update", {"message": "🛡️ Finding Vulnerabilities..."}, to=sid)
 
-    try:
-        crawler = JSFileCrawler(base_url, max_depth=4)
-        js_files = sorted(set(crawler.crawl()))
-
-        emit("scan_update", {"message": f"🔎 Finding files, found: {len(js_files)} files"}, to=sid)
-        emit("scan_update", {"message": "🛡️ Finding Vulnerabilities..."}, to=sid)
-
-        socketio.start_background_task(process_scan_and_summarize, js_files, base_url, user_id, sid)
-    except Exception as e:
-        emit("scan_update", {"message": f"❌ Error during crawl: {e}"}, to=sid)
-
-
-def process_scan_and_summarize(js_files, base_url, user_id, sid):
-    try:
-        payload = {
-            "website_link": base_url,
-            "user_id": user_id,
-            "scan_complete": False
-        }
-
-        print("Inserting scan record:", payload)
-
-        headers = {
-            "apikey": supabase_key,
-            "Authorization": f"Bearer {supabase_key}",
-            "Content-Type": "application/json",
-            "Prefer": "return=representation",
-        }
-
-        response = httpx.post(f"{supabase_url}/rest/v1/website_scans", headers=headers, json=payload)
-
-        if response.status_code != 201:
-            socketio.emit("scan_update", {"message": f"❌ Supabase insert failed: {response.text}"}, to=sid)
-            return
-
-        scan_id = response.json()[0]["id"]
-        socketio.emit("scan_update", {"message": "JS scanning complete. Now summarizing..."}, to=sid)
-
-        socketio.start_background_task(scan_and_process_files, js_files, scan_id, sid)
-
-    except Exception as e:
-        print("DB Insert or Summary Error:", e)
-        socketio.emit("scan_update", {"message": f"❌ Error in DB or summarization: {e}"}, to=sid)
-
-
-def scan_and_process_files(js_files, scan_id, sid):
-    print("🔥 scan_and_process_files started with", len(js_files), "files")
-    final_results = []
-    total_files = len(js_files)
-
-    try:
-        for idx, js_url in enumerate(js_files):
-            print(f"🌐 Fetching {js_url}")
-            js_code = fetch_js_with_fallback(js_url)
-            filtered_code = more_aggressive_filter(js_code)
-            chunks = split_js_code(filtered_code)
-
-            socketio.emit(
-                "scan_update",
-                {"message": f"📄 Scanning file {idx + 1}/{total_files} — {len(chunks)} chunk(s)"},
-                to=sid
-            )
-
-            futures = []
-            with ThreadPoolExecutor(max_workers=4) as executor:
-                for i, chunk in enumerate(chunks):
-                    futures.append(
-                        executor.submit(process_chunk, chunk, js_url, i, len(chunks), sid)
-                    )
-
-                for future in as_completed(futures):
-                    try:
-                        result = future.result()
-                        final_results.extend(result)
-                    except Exception as e:
-                        print(f"Future failed: {e}")
-                        socketio.emit("scan_update", {"message": f"Error processing chunk: {e}"}, to=sid)
-
-        socketio.emit("scan_update", {"message": "Summarizing complete!"}, to=sid)
-
-        summarized_result = summarize_vulnerabilities(final_results)
-
-        socketio.emit("scan_complete", summarized_result, to=sid)
-
-        threading.Thread(target=update_scan_record, args=(scan_id, summarized_result)).start()
-
-    except Exception as e:
-        print(f"Error in processing files: {e}")
-        socketio.emit("scan_update", {"message": f"Error in processing: {e}"}, to=sid)
-
+    pool = get_worker_pool()
+    if not pool:
+        socketio.start_background_task(
+            scanjob.process_scan_and_summarize, base_url, user_id, sid, resume_scan_id, incremental, budget
+        )
+        return
 
-def update_scan_record(scan_id, final_results):
-    try:
-        headers = {
-            "apikey": supabase_key,
-            "Authorization": f"Bearer {supabase_key}",
-            "Content-Type": "application/json",
-            "Prefer": "return=representation"
-        }
+    if pool.queue.queued_for_user(user_id) >= MAX_QUEUED_PER_USER:
+        emit("scan_update", {"message": "❌ Too many scans queued, please wait for one to finish."}, to=sid)
+        return
 
-        response = httpx.patch(
-            f"{supabase_url}/rest/v1/website_scans?id=eq.{scan_id}",
-            headers=headers,
-            json={
-                "vulnerabilities": final_results,
-                "scan_complete": True
-            }
-        )
-    except Exception as e:
-        print("Error updating scan record:", e)
-
-
-def process_chunk(chunk, js_url, chunk_index, total_chunks, sid):
-    socketio.emit(
-        "scan_update",
-        {"message": f"🧩 Scanning chunk {chunk_index + 1}/{total_chunks}"},
-        to=sid
-    )
-    retries = 0
-    while retries < len(GEMINI_KEYS):
-        try:
-            model = GeminiPool(GEMINI_KEYS).get_model()
-            result = model.generate_content(create_prompt(chunk)).text
-            parsed = extract_json_from_response(result)
-            for entry in parsed:
-                entry["file_url"] = js_url
-            return parsed
-        except Exception as e:
-            print(f"⚠️ Error in chunk {chunk_index + 1} of {js_url}: {e}")
-            GeminiPool(GEMINI_KEYS).rotate_key()
-            retries += 1
-    return []
+    position = pool.submit(user_id, sid, {
+        "url": base_url,
+        "resume_scan_id": resume_scan_id,
+        "incremental": incremental,
+        "budget": budget,
+    })
+    emit("scan_update", {"message": f"⏳ Scan queued (position {position})"}, to=sid)
 
 
 @app.route("/")
@@ -179,5 +85,10 @@ def home():
     return "🔌 SocketIO Server Running!"
 
 
+@app.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype=METRICS_CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     socketio.run(app, host="0.0.0.0", port=5001, debug=True)
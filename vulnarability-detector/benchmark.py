@@ -0,0 +1,442 @@
+import argparse
+import functools
+import json
+import math
+import os
+import random
+import re
+import shutil
+import string
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+from jscrawler import JSFileCrawler
+from llmscheduler import GeminiScheduler
+from scanner import more_aggressive_filter, split_js_code, scan_all_js
+from summarize import summarize_vulnerabilities
+
+# Offline benchmark: builds a synthetic site with planted secrets, serves it
+# on localhost and runs the crawler, filter, chunker, scan and summary
+# against a stub Gemini client. Results are written as JSON and can be
+# compared with a previous run to gate regressions:
+#
+#   python benchmark.py --pages 100 --bundles 20 --output bench.json
+#   python benchmark.py --baseline bench.json
+
+DEFAULT_OUTPUT = "benchmark-results.json"
+PACKED_FILE_PATTERN = re.compile(r"/\* ===== FILE (\d+): ")
+
+# (metric path, True if higher is better) compared against --baseline.
+GATED_METRICS = [
+    (("crawl", "pages_per_second"), True),
+    (("filter", "mb_per_second"), True),
+    (("scan", "llm_calls_per_mb"), False),
+    (("scan", "latency_p99_ms"), False),
+    (("recall", "scan"), True),
+    (("recall", "summary"), True),
+]
+
+
+def random_token(rng, length, alphabet=string.ascii_letters + string.digits):
+    return "".join(rng.choice(alphabet) for _ in range(length))
+
+
+def plant_secret(rng, n):
+    # Returns (js snippet, value a correct finding must contain).
+    # Kinds are taken in turn so every shape is planted at the default size.
+    kinds = [
+        "stripe", "aws", "github", "google", "firebase", "upload_preset", "websocket",
+        "minified_return", "minified_case", "short_config", "escaped_quote", "regex_literal",
+        "dom_sink", "token_storage", "eval_hash", "message_listener",
+    ]
+    kind = kinds[n % len(kinds)]
+    if kind == "stripe":
+        value = "sk_live_" + random_token(rng, 24)
+        return f'var stripeKey{n}="{value}";', value
+    if kind == "aws":
+        value = "AKIA" + random_token(rng, 16, string.ascii_uppercase + string.digits)
+        return f'const awsAccessKey{n}="{value}";', value
+    if kind == "github":
+        value = "ghp_" + random_token(rng, 36)
+        return f'let githubToken{n}="{value}";', value
+    if kind == "google":
+        value = "AIza" + random_token(rng, 35)
+        return f'window.mapsKey{n}="{value}";', value
+    if kind == "firebase":
+        value = "AIza" + random_token(rng, 35)
+        project = f"bench-{n}-{random_token(rng, 6).lower()}"
+        return (
+            f'const firebaseConfig{n}={{apiKey:"{value}",authDomain:"{project}.firebaseapp.com",'
+            f'projectId:"{project}",storageBucket:"{project}.appspot.com",appId:"1:{rng.randint(10**9, 10**10)}:web:'
+            f'{random_token(rng, 12).lower()}"}};'
+        ), value
+    if kind == "upload_preset":
+        value = f"bench_preset_{random_token(rng, 8).lower()}"
+        return f'fd.append("upload_preset","{value}");', value
+    # Minified shapes the literal-state filter has to get right: a literal
+    # glued to a keyword, a short value known only by its key name, and a
+    # key next to an escaped quote or a regex literal holding quotes.
+    if kind == "minified_return":
+        value = f"https://api-{n}.bench-{random_token(rng, 5).lower()}.example.com/v1"
+        return f'function apiBase{n}(){{return"{value}"}}', value
+    if kind == "minified_case":
+        value = "sk_live_" + random_token(rng, 24)
+        return f'switch(e){{case"{value}":return {n}}}', value
+    if kind == "short_config":
+        value = random_token(rng, 6).lower()
+        return f'var c{n}={{apiKey:"{value}"}};', value
+    if kind == "escaped_quote":
+        value = "ghp_" + random_token(rng, 36)
+        return f'var m{n}=\'can\\\'t load\',t{n}="{value}";', value
+    if kind == "regex_literal":
+        value = "AKIA" + random_token(rng, 16, string.ascii_uppercase + string.digits)
+        return f'var q{n}=s.replace(/["\']/g,""),k{n}="{value}";', value
+    # DOM sinks, storage and postMessage handlers that carry no signal
+    # literal; the value is the sink statement the LLM has to see.
+    if kind == "dom_sink":
+        value = f"o{n}.innerHTML=e.data"
+        return f'var o{n}=document.getElementById("out");{value};', value
+    if kind == "token_storage":
+        value = f"s{n}.accessToken"
+        return f'localStorage.setItem("token",{value});', value
+    if kind == "eval_hash":
+        value = f"eval(location.hash.slice({n}))"
+        return f"function r{n}(){{{value}}}", value
+    if kind == "message_listener":
+        value = f"h{n}(e.data)"
+        return f'window.addEventListener("message",function(e){{{value}}});', value
+    value = f"wss://ws-{n}.bench-{random_token(rng, 5).lower()}.example.com/socket"
+    return f'var socketUrl{n}="{value}";', value
+
+
+def filler_statement(rng, n, minified):
+    name = f"f{n}" if minified else f"computeValue{n}"
+    arg = "a" if minified else "input"
+    body = rng.choice([
+        f"return {arg}*{rng.randint(2, 99)}+{rng.randint(0, 999)}",
+        f"return {arg}.map(function(x){{return x+{rng.randint(1, 9)}}})",
+        f'return "{random_token(rng, 8)}"+{arg}',
+        f"if({arg}>{rng.randint(1, 50)}){{return null}}return {arg}",
+        f'return document.getElementById("el-{rng.randint(1, 500)}")',
+    ])
+    if minified:
+        return f"function {name}({arg}){{{body}}}"
+    return f"function {name}({arg}) {{\n    {body};\n}}\n"
+
+
+def generate_bundle(rng, bundle_bytes, minified, secrets_per_bundle, counter):
+    parts, size, planted = [], 0, []
+    plant_at = sorted(rng.sample(range(1, 1000), secrets_per_bundle))
+    n = 0
+    while size < bundle_bytes:
+        statement = filler_statement(rng, n, minified)
+        parts.append(statement)
+        size += len(statement)
+        n += 1
+    for slot in plant_at:
+        counter[0] += 1
+        snippet, value = plant_secret(rng, counter[0])
+        parts.insert(len(parts) * slot // 1000, snippet if minified else snippet + "\n")
+        planted.append(value)
+    return (";" if minified else "").join(parts), planted
+
+
+def generate_site(directory, pages=50, bundles=10, bundle_kb=200, minified_ratio=0.7,
+                  secrets_per_bundle=2, seed=1337):
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(directory, "static"), exist_ok=True)
+    counter = [0]
+    planted = {}
+    for b in range(bundles):
+        minified = rng.random() < minified_ratio
+        code, values = generate_bundle(rng, bundle_kb * 1024, minified, secrets_per_bundle, counter)
+        name = f"static/bundle-{b}{'.min' if minified else ''}.js"
+        with open(os.path.join(directory, name), "w") as f:
+            f.write(code)
+        planted[name] = values
+
+    bundle_names = sorted(planted)
+    for p in range(pages):
+        links = [c for c in (2 * p + 1, 2 * p + 2) if c < pages]
+        scripts = rng.sample(bundle_names, min(len(bundle_names), rng.randint(1, 3)))
+        if p < len(bundle_names):
+            scripts.append(bundle_names[p])
+        html = "<!doctype html><html><head><title>Bench page {}</title>{}</head><body>{}</body></html>".format(
+            p,
+            "".join(f'<script src="/{s}"></script>' for s in scripts),
+            "".join(f'<a href="/page-{c}.html">page {c}</a>' for c in links),
+        )
+        with open(os.path.join(directory, "index.html" if p == 0 else f"page-{p}.html"), "w") as f:
+            f.write(html)
+
+    depth = math.ceil(math.log2(pages + 1)) + 1
+    return planted, depth
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(directory):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+class StubRateLimit(Exception):
+    code = 429
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModels:
+    def __init__(self, llm):
+        self.llm = llm
+
+    def generate_content(self, model, contents):
+        return StubResponse(self.llm.respond(contents))
+
+
+class StubClient:
+    def __init__(self, llm):
+        self.models = StubModels(llm)
+
+
+class StubLLM:
+    # Stands in for the Gemini client: sleeps for a jittered latency, fails
+    # with a 429 at rate_limit_rate, and "finds" exactly the planted values
+    # present in the prompt. Summary prompts are echoed back unchanged.
+
+    def __init__(self, planted_values, latency=0.05, rate_limit_rate=0.0, retry_delay=0.1, seed=1337):
+        self.planted_values = planted_values
+        self.latency = latency
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_delay = retry_delay
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.rate_limited = 0
+        self.prompt_bytes = 0
+
+    def respond(self, prompt):
+        with self.lock:
+            self.calls += 1
+            self.prompt_bytes += len(prompt)
+            limited = self.rng.random() < self.rate_limit_rate
+            latency = self.latency * self.rng.uniform(0.5, 1.5)
+        time.sleep(latency)
+        if limited:
+            with self.lock:
+                self.rate_limited += 1
+            raise StubRateLimit(f'429 RESOURCE_EXHAUSTED retry_delay: "{self.retry_delay}s"')
+
+        if "Here is the data:" in prompt:
+            return "###JSONSTART\n" + prompt.split("Here is the data:", 1)[1].strip() + "\n###JSONEND"
+
+        markers = [(m.start(), m.group(1)) for m in PACKED_FILE_PATTERN.finditer(prompt)]
+        findings = []
+        for value in self.planted_values:
+            pos = prompt.find(value)
+            if pos == -1:
+                continue
+            owner = [index for start, index in markers if start < pos]
+            findings.append({
+                "vulnerability_type": "Secrets/API Key Leak",
+                "name": "Planted secret",
+                "description": "Synthetic secret planted by the benchmark.",
+                "leaked_value": value,
+                "recommendation": "None, this is a benchmark.",
+                "severity": "high",
+                "file_url": f"FILE {owner[-1]}" if owner else "N/A",
+            })
+        return "```json\n" + json.dumps(findings) + "\n```"
+
+
+class TimedScheduler:
+    # Records wall-clock latency of every generate() call, retries included.
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.lock = threading.Lock()
+        self.latencies = []
+
+    def generate(self, prompt):
+        started = time.monotonic()
+        try:
+            return self.scheduler.generate(prompt)
+        finally:
+            with self.lock:
+                self.latencies.append(time.monotonic() - started)
+
+
+def build_scheduler(llm, keys, requests_per_minute):
+    scheduler = GeminiScheduler(
+        [(f"bench-key-{i}", requests_per_minute) for i in range(keys)], max_concurrency=keys
+    )
+    for slot in scheduler.slots:
+        slot.client = StubClient(llm)
+    return scheduler
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def recall(planted_values, findings):
+    if not planted_values:
+        return None
+    haystack = json.dumps([entry.get("leaked_value") for entry in findings if isinstance(entry, dict)])
+    return round(sum(value in haystack for value in planted_values) / len(planted_values), 4)
+
+
+def run_benchmark(args):
+    directory = tempfile.mkdtemp(prefix="guardex-bench-")
+    server = None
+    try:
+        planted, depth = generate_site(
+            directory, args.pages, args.bundles, args.bundle_kb, args.minified_ratio,
+            args.secrets_per_bundle, args.seed,
+        )
+        planted_values = [value for values in planted.values() for value in values]
+        server, base_url = serve(directory)
+        print(f"🧪 Serving {args.pages} pages and {args.bundles} bundles from {base_url}")
+
+        started = time.monotonic()
+        crawler = JSFileCrawler(base_url, max_depth=depth, concurrency=args.concurrency)
+        js_files = crawler.crawl()
+        crawl_seconds = time.monotonic() - started
+
+        sources = {}
+        for name in planted:
+            with open(os.path.join(directory, name)) as f:
+                sources[name] = f.read()
+        total_bytes = sum(len(code) for code in sources.values())
+
+        started = time.monotonic()
+        filtered = [more_aggressive_filter(code) for code in sources.values()]
+        filter_seconds = time.monotonic() - started
+        filtered_bytes = sum(len(code) for code in filtered)
+
+        started = time.monotonic()
+        chunk_count = sum(1 for code in filtered for _ in split_js_code(code))
+        split_seconds = time.monotonic() - started
+
+        llm = StubLLM(planted_values, args.llm_latency, args.rate_limit_rate, args.retry_delay, args.seed)
+        scheduler = TimedScheduler(build_scheduler(llm, args.keys, args.rpm))
+        started = time.monotonic()
+        scan_results = scan_all_js(sorted(js_files), [], scheduler=scheduler, inline_scripts=crawler.inline_scripts)
+        scan_seconds = time.monotonic() - started
+        scan_calls = llm.calls
+
+        started = time.monotonic()
+        summary = summarize_vulnerabilities(scan_results, scheduler=scheduler)
+        summary_seconds = time.monotonic() - started
+
+        megabytes = total_bytes / (1024 * 1024)
+        stats = scheduler.scheduler.stats
+        return {
+            "config": vars(args),
+            "crawl": {
+                "pages": crawler.pages_crawled,
+                "js_files": len(js_files),
+                "seconds": round(crawl_seconds, 3),
+                "pages_per_second": round(crawler.pages_crawled / crawl_seconds, 2) if crawl_seconds else None,
+            },
+            "filter": {
+                "input_mb": round(megabytes, 3),
+                "output_mb": round(filtered_bytes / (1024 * 1024), 3),
+                "seconds": round(filter_seconds, 3),
+                "mb_per_second": round(megabytes / filter_seconds, 2) if filter_seconds else None,
+            },
+            "split": {
+                "chunks": chunk_count,
+                "seconds": round(split_seconds, 4),
+            },
+            "scan": {
+                "seconds": round(scan_seconds, 3),
+                "findings": len(scan_results),
+                "llm_calls": scan_calls,
+                "llm_calls_per_mb": round(scan_calls / megabytes, 3) if megabytes else None,
+                "prompt_mb": round(llm.prompt_bytes / (1024 * 1024), 3),
+                "rate_limited": stats["rate_limited"],
+                "retries": stats["retries"],
+                "latency_p50_ms": round(percentile(scheduler.latencies, 0.5) * 1000, 1) if scheduler.latencies else None,
+                "latency_p99_ms": round(percentile(scheduler.latencies, 0.99) * 1000, 1) if scheduler.latencies else None,
+            },
+            "summary": {
+                "seconds": round(summary_seconds, 3),
+                "entries": len(summary),
+            },
+            "recall": {
+                "planted": len(planted_values),
+                "scan": recall(planted_values, scan_results),
+                "summary": recall(planted_values, summary),
+            },
+        }
+    finally:
+        if server:
+            server.shutdown()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+    for path, higher_is_better in GATED_METRICS:
+        current, previous = results, baseline
+        for key in path:
+            current = (current or {}).get(key)
+            previous = (previous or {}).get(key)
+        if current is None or not previous:
+            continue
+        change = (current - previous) / previous
+        if (change < -tolerance) if higher_is_better else (change > tolerance):
+            regressions.append(f"{'.'.join(path)}: {previous} -> {current} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline Guardex scan benchmark")
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--bundles", type=int, default=10)
+    parser.add_argument("--bundle-kb", type=int, default=200)
+    parser.add_argument("--minified-ratio", type=float, default=0.7)
+    parser.add_argument("--secrets-per-bundle", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--keys", type=int, default=4)
+    parser.add_argument("--rpm", type=int, default=6000)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--retry-delay", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=1337)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"📄 Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"❌ Regression: {regression}")
+        if regressions:
+            raise SystemExit(1)
+        print("✅ No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+CHECKPOINT_TABLE = "scan_file_results"
+SCANS_TABLE = "website_scans"
+
+
+class ScanCheckpoints:
+    # Per-file results stored next to website_scans in a scan_file_results
+    # table (scan_id, file_url, content_hash, findings), unique on
+    # (scan_id, file_url). Rows are queued as each file finishes and written
+    # in batches by the store, so an interrupted scan can be resumed and a
+    # rescan can reuse unchanged files.
+
+    def __init__(self, store):
+        self.store = store
+
+    def create_scan(self, website_link, user_id):
+        response = self.store.request(
+            "POST",
+            f"/{SCANS_TABLE}",
+            "insert_scan",
+            headers={"Prefer": "return=representation"},
+            json={"website_link": website_link, "user_id": user_id, "scan_complete": False},
+        )
+        return response.json()[0]["id"]
+
+    def complete_scan(self, scan_id, vulnerabilities):
+        self.store.patch(SCANS_TABLE, {"id": scan_id}, {"vulnerabilities": vulnerabilities, "scan_complete": True})
+
+    def save_timings(self, scan_id, timings):
+        # Separate from complete_scan so a table without the timings column
+        # still gets its results.
+        self.store.patch(SCANS_TABLE, {"id": scan_id}, {"timings": timings})
+
+    def get_scan(self, scan_id):
+        response = self.store.request(
+            "GET",
+            f"/{SCANS_TABLE}",
+            "get_scan",
+            params={"id": f"eq.{scan_id}", "select": "id,website_link,user_id,scan_complete"},
+        )
+        rows = response.json()
+        return rows[0] if rows else None
+
+    def latest_completed_scan(self, website_link, user_id):
+        response = self.store.request(
+            "GET",
+            f"/{SCANS_TABLE}",
+            "latest_scan",
+            params={
+                "website_link": f"eq.{website_link}",
+                "user_id": f"eq.{user_id}",
+                "scan_complete": "eq.true",
+                "select": "id,vulnerabilities",
+                "order": "id.desc",
+                "limit": "1",
+            },
+        )
+        rows = response.json()
+        return rows[0] if rows else None
+
+    def load(self, scan_id):
+        response = self.store.request(
+            "GET",
+            f"/{CHECKPOINT_TABLE}",
+            "load_checkpoints",
+            params={"scan_id": f"eq.{scan_id}", "select": "file_url,content_hash,findings"},
+        )
+        return {
+            row["file_url"]: {"content_hash": row["content_hash"], "findings": row["findings"] or []}
+            for row in response.json()
+        }
+
+    def save(self, scan_id, file_url, content_hash, findings):
+        self.store.upsert(
+            CHECKPOINT_TABLE,
+            {"scan_id": scan_id, "file_url": file_url, "content_hash": content_hash, "findings": findings},
+            on_conflict="scan_id,file_url",
+        )
@@ -0,0 +1,135 @@
+import hashlib
+import heapq
+import random
+import re
+import threading
+import zlib
+
+NUM_PERM = 64
+LSH_BANDS = 8
+SHINGLE_TOKENS = 5
+SIMILARITY_THRESHOLD = 0.85
+MAX_SHINGLES = 4096
+MERSENNE_PRIME = (1 << 61) - 1
+JS_TOKEN = re.compile(r"[A-Za-z_$][\w$]*|\d+|\S")
+# Quoted literals and URLs: the values a near copy could differ in without
+# moving its MinHash much (a swapped key or endpoint).
+LITERAL_VALUE = re.compile(
+    r""""[^"\\\n]*(?:\\.[^"\\\n]*)*"|'[^'\\\n]*(?:\\.[^'\\\n]*)*'|`[^`\\]*(?:\\.[^`\\]*)*`"""
+    r"|(?:https?|wss?)://[^\s\"'`]+"
+)
+
+_rng = random.Random(1729)
+PERMUTATIONS = [(_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+
+def shingle_hashes(code):
+    # Token shingles, so whitespace and line breaks do not matter. Very long
+    # chunks keep only the MAX_SHINGLES smallest hashes, which is the same
+    # sample for any two chunks that share them.
+    tokens = JS_TOKEN.findall(code)
+    hashes = {
+        zlib.crc32(" ".join(tokens[i:i + SHINGLE_TOKENS]).encode("utf-8", "surrogatepass"))
+        for i in range(max(0, len(tokens) - SHINGLE_TOKENS + 1))
+    }
+    if len(hashes) > MAX_SHINGLES:
+        hashes = heapq.nsmallest(MAX_SHINGLES, hashes)
+    return hashes
+
+
+def minhash(code):
+    hashes = shingle_hashes(code)
+    if not hashes:
+        return None
+    return tuple(min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in PERMUTATIONS)
+
+
+def similarity(sig_a, sig_b):
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+
+def literals_covered(copy_code, leader_code):
+    # True if every literal and URL in the copy also appears in the leader,
+    # i.e. the leader's analysis saw every value the copy holds.
+    leader_values = set(LITERAL_VALUE.findall(leader_code))
+    return all(value in leader_values for value in LITERAL_VALUE.findall(copy_code))
+
+
+class ChunkDeduplicator:
+    # Per-scan index of chunks headed for the LLM. The first copy of a chunk
+    # becomes the leader and is analyzed; exact copies (same SHA-256) and
+    # near copies (MinHash over token shingles, LSH-banded, estimated Jaccard
+    # >= threshold) become its followers and receive the leader's findings
+    # once it resolves. claim() returns (None, None) for a new leader,
+    # (leader, None) for a follower still waiting, and (leader, findings)
+    # when the leader has already been analyzed.
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD, bands=LSH_BANDS):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        self.lock = threading.Lock()
+        self.exact = {}
+        self.buckets = {}
+        self.signatures = {}
+        self.followers = {}
+        self.resolved = {}
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    def band_keys(self, signature):
+        return [(band, signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+    def claim(self, task):
+        key = hashlib.sha256(task.code.encode("utf-8", "surrogatepass")).hexdigest()
+        signature = minhash(task.code)
+        with self.lock:
+            leader = self.exact.get(key)
+            if leader is not None:
+                self.exact_duplicates += 1
+            elif signature is not None:
+                leader = self.nearest(signature)
+                if leader is not None:
+                    self.near_duplicates += 1
+
+            if leader is None:
+                self.exact[key] = task
+                if signature is not None:
+                    self.signatures[task] = signature
+                    for band_key in self.band_keys(signature):
+                        self.buckets.setdefault(band_key, []).append(task)
+                return None, None
+
+            if leader in self.resolved:
+                return leader, self.resolved[leader]
+            self.followers.setdefault(leader, []).append(task)
+            return leader, None
+
+    def nearest(self, signature):
+        best, best_score = None, self.threshold
+        candidates = {task for band_key in self.band_keys(signature) for task in self.buckets.get(band_key, ())}
+        for candidate in candidates:
+            score = similarity(signature, self.signatures[candidate])
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+    def resolve(self, leader, findings):
+        # Returns the followers waiting on leader. findings=None means the
+        # leader failed: it is dropped so a later copy can lead instead.
+        with self.lock:
+            followers = self.followers.pop(leader, [])
+            if findings is not None:
+                self.resolved[leader] = findings
+            else:
+                self.drop(leader)
+        return followers
+
+    def drop(self, leader):
+        self.exact = {key: task for key, task in self.exact.items() if task is not leader}
+        signature = self.signatures.pop(leader, None)
+        if signature is not None:
+            for band_key in self.band_keys(signature):
+                bucket = self.buckets.get(band_key, [])
+                if leader in bucket:
+                    bucket.remove(leader)
@@ -0,0 +1,22 @@
+import os
+
+# Supabase client
+supabase_url = ""
+supabase_key = ""
+
+GEMINI_KEYS = [
+]
+
+FETCH_WORKERS = 4
+LLM_WORKERS = 8
+LLM_MAX_CONCURRENCY = 8
+CRAWL_POLITENESS_DELAY = 0.05
+
+# Scan worker processes; 0 runs scans inside the web process instead.
+SCAN_PROCESSES = max(1, (os.cpu_count() or 2) - 1)
+MAX_RUNNING_PER_USER = 1
+MAX_QUEUED_PER_USER = 5
+
+# Quick scans stop sending chunks to the LLM once either budget is spent.
+QUICK_SCAN_SECONDS = 60
+QUICK_SCAN_TOKENS = 150000
@@ -0,0 +1,202 @@
+import math
+import re
+from collections import Counter
+
+# (prefixes, vendor, vulnerability_type, severity, full token pattern)
+CREDENTIAL_RULES = [
+    (("sk_live_",), "Stripe", "Stripe Secret Key Leak", "critical", r"sk_live_[0-9A-Za-z]{16,}"),
+    (("rk_live_",), "Stripe", "Stripe Restricted Key Leak", "critical", r"rk_live_[0-9A-Za-z]{16,}"),
+    (("sk_test_",), "Stripe", "Stripe Test Secret Key Leak", "medium", r"sk_test_[0-9A-Za-z]{16,}"),
+    (("ghp_", "gho_", "ghu_", "ghs_", "ghr_"), "GitHub", "GitHub Token Leak", "critical", r"gh[pousr]_[A-Za-z0-9]{36,}"),
+    (("github_pat_",), "GitHub", "GitHub Token Leak", "critical", r"github_pat_[A-Za-z0-9_]{22,}"),
+    # Real keys mix case and digits; this keeps CSS classes such as
+    # sk-fading-circle-spinner-wrapper out.
+    (("sk-",), "OpenAI", "OpenAI API Key Leak", "critical", r"sk-(?:proj-|svcacct-|admin-)?(?=[\w\-]*\d)(?=[\w\-]*[A-Z])[\w\-]{20,}"),
+    (("AIza",), "Google Cloud", "Google API Key Leak", "medium", r"AIza[0-9A-Za-z_\-]{35}"),
+    (("AKIA", "ASIA"), "AWS", "AWS Access Key Leak", "high", r"(?:AKIA|ASIA)[0-9A-Z]{16}"),
+    (("xoxb-", "xoxp-", "xoxa-", "xoxr-", "xoxs-"), "Slack", "Slack Token Leak", "high", r"xox[baprs]-[0-9A-Za-z\-]{10,}"),
+    (("SG.",), "SendGrid", "SendGrid API Key Leak", "high", r"SG\.[A-Za-z0-9_\-]{22}\.[A-Za-z0-9_\-]{43}"),
+    (("eyJ",), "JWT", "JWT Token Exposure", "high", r"eyJ[A-Za-z0-9_\-]{8,}\.eyJ[A-Za-z0-9_\-]{8,}\.[A-Za-z0-9_\-]{8,}"),
+]
+
+# No "=" in the class, so ?key=AIza… and token=ghp_… still start a token
+# at the credential prefix.
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9_\-.+/]{16,}")
+# Subresource Integrity hashes (integrity="sha384-…") are random but public.
+INTEGRITY_HASH_PATTERN = re.compile(r"sha\d+-")
+# Inlined fonts and images (data:…;base64,…) are random too, and longer
+# than any key worth reporting by entropy alone.
+DATA_URI_PREFIXES = ("base64,", "data:")
+MAX_ENTROPY_TOKEN_LENGTH = 128
+FIREBASE_API_KEY_PATTERN = re.compile(r"""apiKey["']?\s*:\s*["'](AIza[0-9A-Za-z_\-]{35})["']""")
+FIREBASE_CONFIG_KEYS = ("authDomain", "projectId", "storageBucket", "messagingSenderId", "appId")
+UPLOAD_PRESET_PATTERN = re.compile(r"""upload_preset["']?\s*[:,=]\s*["']([^"'\s]+)["']""")
+WEBSOCKET_PATTERN = re.compile(r"""["'`](wss?://[^"'`\s]+)["'`]""")
+# DOM sinks, storage and cross-window messaging: code the LLM looks at for
+# XSS, token storage and postMessage issues even when it holds no literal.
+DOM_SINK_HINTS = (
+    "innerHTML", "outerHTML", "insertAdjacentHTML", "dangerouslySetInnerHTML",
+    "document.write(", "document.writeln(", "eval(", "new Function",
+    "postMessage", 'addEventListener("message"', "addEventListener('message'",
+    "localStorage", "sessionStorage",
+)
+LLM_HINT_PATTERN = re.compile(
+    r"api_?key|secret|token|passw|auth|bearer|credential|"
+    + "|".join(re.escape(hint) for hint in DOM_SINK_HINTS)
+    + r"|upload|/api/|graphql|firebase|supabase|cloudinary|wss?://",
+    re.IGNORECASE,
+)
+
+ENTROPY_MIN_LENGTH = 24
+ENTROPY_THRESHOLD = 4.2
+FIREBASE_CONFIG_SPAN = 600
+
+
+class PrefixTrie:
+    def __init__(self):
+        self.root = {}
+
+    def add(self, prefix, value):
+        node = self.root
+        for ch in prefix:
+            node = node.setdefault(ch, {})
+        node[None] = value
+
+    def longest_match(self, text):
+        node = self.root
+        found = None
+        for ch in text:
+            node = node.get(ch)
+            if node is None:
+                break
+            if None in node:
+                found = node[None]
+        return found
+
+
+def build_credential_trie():
+    trie = PrefixTrie()
+    for prefixes, vendor, vulnerability_type, severity, pattern in CREDENTIAL_RULES:
+        rule = (vendor, vulnerability_type, severity, re.compile(pattern))
+        for prefix in prefixes:
+            trie.add(prefix, rule)
+    return trie
+
+
+CREDENTIAL_TRIE = build_credential_trie()
+
+
+def shannon_entropy(value):
+    length = len(value)
+    return -sum(count / length * math.log2(count / length) for count in Counter(value).values())
+
+
+def looks_random(token):
+    if not ENTROPY_MIN_LENGTH <= len(token) <= MAX_ENTROPY_TOKEN_LENGTH:
+        return False
+    if "//" in token or token[0] in "./" or "." in token:
+        return False
+    if INTEGRITY_HASH_PATTERN.match(token):
+        return False
+    if not any(c.isdigit() for c in token) or not any(c.isalpha() for c in token):
+        return False
+    return shannon_entropy(token) >= ENTROPY_THRESHOLD
+
+
+def make_finding(vulnerability_type, name, description, leaked_value, recommendation, severity):
+    return {
+        "vulnerability_type": vulnerability_type,
+        "name": name,
+        "description": description,
+        "leaked_value": leaked_value,
+        "recommendation": recommendation,
+        "severity": severity,
+        "file_url": "N/A",
+    }
+
+
+def detect_firebase_configs(code):
+    findings = []
+    for match in FIREBASE_API_KEY_PATTERN.finditer(code):
+        start = code.rfind("{", max(0, match.start() - FIREBASE_CONFIG_SPAN), match.start())
+        end = code.find("}", match.end(), match.end() + FIREBASE_CONFIG_SPAN)
+        if start == -1 or end == -1:
+            continue
+        config = code[start:end + 1]
+        if sum(key in config for key in FIREBASE_CONFIG_KEYS) < 2:
+            continue
+        findings.append(make_finding(
+            "Firebase Config Leak",
+            "Firebase configuration exposed in client bundle",
+            "A full Firebase config object is hardcoded in the JavaScript, exposing the project's API key and identifiers.",
+            config,
+            "Restrict the API key to your domains, lock down Firestore/Storage security rules and enable App Check.",
+            "medium",
+        ))
+    return findings
+
+
+def detect_secrets(code):
+    findings = detect_firebase_configs(code)
+    reported = {value for finding in findings for value in FIREBASE_API_KEY_PATTERN.findall(finding["leaked_value"])}
+
+    for match in TOKEN_PATTERN.finditer(code):
+        if code.endswith(DATA_URI_PREFIXES, 0, match.start()):
+            continue
+        token = match.group(0)
+        rule = CREDENTIAL_TRIE.longest_match(token)
+        if rule:
+            vendor, vulnerability_type, severity, pattern = rule
+            full = pattern.match(token)
+            if not full or full.group(0) in reported:
+                continue
+            reported.add(full.group(0))
+            findings.append(make_finding(
+                vulnerability_type,
+                f"Hardcoded {vendor} credential",
+                f"A {vendor} credential is embedded in client-side JavaScript and can be extracted by anyone.",
+                full.group(0),
+                f"Revoke and rotate this {vendor} credential and move it to a server-side secret store.",
+                severity,
+            ))
+        elif token not in reported and looks_random(token):
+            reported.add(token)
+            findings.append(make_finding(
+                "Secrets/API Key Leak",
+                "High-entropy string that looks like a secret",
+                "A long random-looking value is hardcoded in client-side JavaScript and may be a credential.",
+                token,
+                "Confirm what this value is; if it is a credential, rotate it and keep it on the server.",
+                "medium",
+            ))
+
+    for preset in set(UPLOAD_PRESET_PATTERN.findall(code)):
+        findings.append(make_finding(
+            "Cloudinary Upload Abuse",
+            "Cloudinary upload preset exposed",
+            "An unsigned Cloudinary upload preset is hardcoded, letting anyone upload files to the account.",
+            preset,
+            "Switch to signed uploads generated by your backend, or restrict the preset's allowed formats and size.",
+            "medium",
+        ))
+
+    for url in set(WEBSOCKET_PATTERN.findall(code)):
+        findings.append(make_finding(
+            "Hardcoded WebSocket URL",
+            "Backend WebSocket endpoint hardcoded",
+            "A WebSocket backend URL is embedded in the client, exposing an internal endpoint to direct connections.",
+            url,
+            "Make sure the WebSocket server authenticates every connection and validates all incoming messages.",
+            "low",
+        ))
+
+    return findings
+
+
+def needs_llm(code, local_findings):
+    return bool(local_findings) or LLM_HINT_PATTERN.search(code) is not None
+
+
+def merge_findings(llm_findings, local_findings):
+    covered = " ".join(str(entry.get("leaked_value")) for entry in llm_findings if isinstance(entry, dict))
+    return llm_findings + [entry for entry in local_findings if entry["leaked_value"] not in covered]
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+FINDINGS_CACHE_PATH = os.path.join(CACHE_DIR, "findings.sqlite3")
+FINDINGS_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+class FindingsCache:
+    # Content-addressed store of parsed LLM findings. Keys are a hash of the
+    # prompt version and the chunk text, so the same vendor bundle on two
+    # different sites is only analyzed once. Least recently used entries are
+    # evicted once the stored payloads exceed max_bytes. Every worker process
+    # writes to the same file, so the total is read back from the table
+    # inside each write transaction rather than tracked per process.
+
+    def __init__(self, path=FINDINGS_CACHE_PATH, max_bytes=FINDINGS_CACHE_MAX_BYTES, prompt_version=""):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_bytes = max_bytes
+        self.prompt_version = prompt_version
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS findings ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS findings_lru ON findings (last_access)")
+        self.conn.commit()
+
+    def make_key(self, chunk):
+        digest = hashlib.sha256()
+        digest.update(self.prompt_version.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(chunk.encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def get(self, chunk, stats=None):
+        key = self.make_key(chunk)
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM findings WHERE key = ?", (key,)).fetchone()
+            if row:
+                self.conn.execute("UPDATE findings SET last_access = ? WHERE key = ?", (time.time(), key))
+                self.conn.commit()
+                self.hits += 1
+            else:
+                self.misses += 1
+            if stats is not None:
+                stats["hits" if row else "misses"] += 1
+        return json.loads(row[0]) if row else None
+
+    def put(self, chunk, findings):
+        key = self.make_key(chunk)
+        value = json.dumps(
+            [{k: v for k, v in entry.items() if k != "file_url"} for entry in findings if isinstance(entry, dict)],
+            separators=(",", ":"),
+        )
+        size = len(value)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO findings (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            self.evict()
+            self.conn.commit()
+
+    def evict(self):
+        # Runs after the write, so the transaction holds the write lock and
+        # no other process can change the total underneath it.
+        total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM findings").fetchone()[0]
+        while total_bytes > self.max_bytes:
+            rows = self.conn.execute(
+                "SELECT key, size FROM findings ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                return
+            for key, size in rows:
+                self.conn.execute("DELETE FROM findings WHERE key = ?", (key,))
+                total_bytes -= size
+                if total_bytes <= self.max_bytes:
+                    return
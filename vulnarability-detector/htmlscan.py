@@ -0,0 +1,74 @@
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+# Inline <script> types worth scanning: JavaScript, and JSON data blocks
+# that frameworks fill with runtime config (__NEXT_DATA__). Structured
+# metadata (application/ld+json), import maps and HTML templates are not.
+SCANNED_SCRIPT_TYPES = (
+    "", "text/javascript", "application/javascript", "text/ecmascript", "application/ecmascript",
+    "module", "text/babel", "text/jsx", "application/json",
+)
+
+
+class PageScanner(HTMLParser):
+    # Event-driven scan that keeps only what the crawler needs (anchors,
+    # script sources, inline script bodies, preload links and <base href>)
+    # instead of building a DOM. feed() can be called with each chunk as it
+    # streams in. url is where the page was actually served from.
+
+    def __init__(self, url=None):
+        super().__init__(convert_charrefs=True)
+        self.url = url
+        self.base_href = None
+        self.links = []
+        self.script_srcs = []
+        self.inline_scripts = []
+        self.preloads = []
+        self.script_attrs = None
+        self.script_parts = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "base" and self.base_href is None:
+            self.base_href = dict(attrs).get("href")
+        elif tag == "a":
+            href = dict(attrs).get("href")
+            if href:
+                self.links.append(href)
+        elif tag == "script":
+            attrs = dict(attrs)
+            if attrs.get("src"):
+                self.script_srcs.append(attrs["src"])
+            else:
+                self.script_attrs = attrs
+                self.script_parts = []
+        elif tag == "link":
+            attrs = dict(attrs)
+            if attrs.get("href"):
+                rel = (attrs.get("rel") or "").lower().split()
+                self.preloads.append((rel, (attrs.get("as") or "").lower(), attrs["href"]))
+
+    def handle_data(self, data):
+        if self.script_attrs is not None:
+            self.script_parts.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == "script" and self.script_attrs is not None:
+            self.inline_scripts.append((self.script_attrs, "".join(self.script_parts)))
+            self.script_attrs = None
+            self.script_parts = []
+
+
+    def base_url(self):
+        # What relative links on the page resolve against.
+        return urljoin(self.url, self.base_href) if self.base_href else self.url
+
+
+def is_html_content_type(content_type):
+    mime = (content_type or "").split(";", 1)[0].strip().lower()
+    return not mime or mime in HTML_CONTENT_TYPES
+
+
+def is_scanned_script(attrs):
+    mime = (attrs.get("type") or "").split(";", 1)[0].strip().lower()
+    return mime in SCANNED_SCRIPT_TYPES
@@ -0,0 +1,155 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from jsbody import JSBody
+from metrics import metrics
+
+HTTP_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "http")
+HTTP_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+
+class HTTPCache:
+    # Disk cache of response bodies for conditional GETs. Only responses that
+    # carry an ETag or Last-Modified validator are stored; a 304 from the
+    # origin is then answered from disk. Bodies live in one file per URL and
+    # the least recently used ones are removed once max_bytes is exceeded.
+    # The index is shared by every worker process, so the total is read back
+    # from it inside each write transaction rather than tracked per process.
+    # Bytes fetched from the origin and answered from disk are counted in
+    # /metrics (guardex_http_cache_bytes_total).
+
+    def __init__(self, directory=HTTP_CACHE_DIR, max_bytes=HTTP_CACHE_MAX_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, encoding TEXT, "
+            "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_access)")
+        self.conn.commit()
+
+    def body_path(self, url):
+        return os.path.join(self.directory, hashlib.sha256(url.encode("utf-8")).hexdigest())
+
+    def conditional_headers(self, url):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT etag, last_modified FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+        headers = {}
+        if row and row[0]:
+            headers["If-None-Match"] = row[0]
+        if row and row[1]:
+            headers["If-Modified-Since"] = row[1]
+        return headers
+
+    def load(self, url):
+        with self.lock:
+            row = self.conn.execute("SELECT encoding FROM responses WHERE url = ?", (url,)).fetchone()
+            if not row:
+                return None
+            try:
+                with open(self.body_path(url), "rb") as f:
+                    body = f.read()
+            except OSError:
+                self.remove(url)
+                self.conn.commit()
+                return None
+            self.conn.execute("UPDATE responses SET last_access = ? WHERE url = ?", (time.time(), url))
+            self.conn.commit()
+        self.count_revalidated(len(body))
+        return body.decode(row[0] or "utf-8", errors="replace")
+
+    def load_body(self, url):
+        # Like load(), but streams the cached file into a JSBody so large
+        # bundles are memory-mapped rather than read into a string.
+        with self.lock:
+            row = self.conn.execute("SELECT encoding FROM responses WHERE url = ?", (url,)).fetchone()
+            if not row:
+                return None
+            try:
+                body = JSBody.from_file(self.body_path(url), row[0])
+            except OSError:
+                self.remove(url)
+                self.conn.commit()
+                return None
+            self.conn.execute("UPDATE responses SET last_access = ? WHERE url = ?", (time.time(), url))
+            self.conn.commit()
+        self.count_revalidated(len(body))
+        return body
+
+    def count_revalidated(self, size):
+        metrics.inc("guardex_http_cache_revalidated_total")
+        metrics.inc("guardex_http_cache_bytes_total", size, source="cache")
+
+    def store(self, url, headers, body, encoding=None):
+        # body is bytes or a JSBody; truncated bodies are never cached.
+        metrics.inc("guardex_http_cache_bytes_total", len(body), source="origin")
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        if not etag and not last_modified or getattr(body, "truncated", False):
+            return
+        with self.lock:
+            # Write then rename, so a body another thread has mapped is never
+            # truncated underneath it.
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(fd, "wb") as f:
+                if isinstance(body, JSBody):
+                    body.copy_to(f)
+                else:
+                    f.write(body)
+            os.replace(tmp_path, self.body_path(url))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (url, etag, last_modified, encoding, size, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, encoding, len(body), time.time()),
+            )
+            self.evict()
+            self.conn.commit()
+
+    def remove(self, url):
+        self.conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+        try:
+            os.remove(self.body_path(url))
+        except OSError:
+            pass
+
+    def evict(self):
+        # Runs after the write, so the transaction holds the write lock and
+        # no other process can change the total underneath it.
+        total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        while total_bytes > self.max_bytes:
+            rows = self.conn.execute("SELECT url, size FROM responses ORDER BY last_access LIMIT 64").fetchall()
+            if not rows:
+                return
+            for url, size in rows:
+                self.remove(url)
+                total_bytes -= size
+                if total_bytes <= self.max_bytes:
+                    return
+
+    def get(self, session, url, timeout=10):
+        # Returns (status, JSBody or None); the body is streamed, never
+        # materialized as response.content/response.text.
+        response = session.get(url, headers=self.conditional_headers(url), timeout=timeout, stream=True)
+        if response.status_code == 304:
+            response.close()
+            cached = self.load_body(url)
+            if cached is not None:
+                return 200, cached
+            response = session.get(url, timeout=timeout, stream=True)
+        with response:
+            if response.status_code != 200:
+                return response.status_code, None
+            body = JSBody.read(response)
+        self.store(url, response.headers, body, body.encoding)
+        return 200, body
+
@@ -0,0 +1,131 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from findingscache import CACHE_DIR
+
+JOB_QUEUE_PATH = os.path.join(CACHE_DIR, "jobs.sqlite3")
+# A job whose worker died this many times is failed instead of requeued,
+# so one bundle that crashes the interpreter cannot take the pool down in
+# a loop.
+MAX_JOB_ATTEMPTS = 3
+
+
+class JobQueue:
+    # Scan jobs persisted in SQLite so queued scans survive a restart and
+    # every worker process can claim from the same table. claim() picks the
+    # user with the fewest running scans (under max_running_per_user), then
+    # the user served least recently, then the oldest job, so one user with
+    # a long queue cannot starve everyone else.
+
+    def __init__(self, path=JOB_QUEUE_PATH, max_running_per_user=1):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_running_per_user = max_running_per_user
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, sid TEXT, payload TEXT NOT NULL, "
+            "status TEXT NOT NULL, worker TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL, "
+            "attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        if "attempts" not in columns:
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, user_id)")
+
+    def enqueue(self, user_id, sid, payload):
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT INTO jobs (user_id, sid, payload, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                (str(user_id), sid, json.dumps(payload), time.time()),
+            )
+            return cursor.lastrowid
+
+    def position(self, job_id):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND id <= ?", (job_id,)
+            ).fetchone()[0]
+
+    def queued_for_user(self, user_id):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND user_id = ?", (str(user_id),)
+            ).fetchone()[0]
+
+    def claim(self, worker_id):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT j.id, j.user_id, j.sid, j.payload FROM jobs j "
+                    "LEFT JOIN (SELECT user_id, "
+                    "SUM(status = 'running') AS running, MAX(COALESCE(started_at, 0)) AS last_started "
+                    "FROM jobs GROUP BY user_id) u ON u.user_id = j.user_id "
+                    "WHERE j.status = 'queued' AND COALESCE(u.running, 0) < ? "
+                    "ORDER BY COALESCE(u.running, 0), COALESCE(u.last_started, 0), j.id LIMIT 1",
+                    (self.max_running_per_user,),
+                ).fetchone()
+                if row:
+                    self.conn.execute(
+                        "UPDATE jobs SET status = 'running', worker = ?, started_at = ?, attempts = attempts + 1 "
+                        "WHERE id = ?",
+                        (worker_id, time.time(), row[0]),
+                    )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        if not row:
+            return None
+        job_id, user_id, sid, payload = row
+        return {"id": job_id, "user_id": user_id, "sid": sid, **json.loads(payload)}
+
+    def finish(self, job_id, status="done"):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?", (status, time.time(), job_id)
+            )
+
+    def set_scan_id(self, job_id, scan_id):
+        # Recorded as soon as the scan row exists, so a requeued job resumes
+        # that scan instead of starting a new one.
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET payload = json_set(payload, '$.resume_scan_id', ?) WHERE id = ?", (scan_id, job_id)
+            )
+
+    def requeue_running(self, worker_id=None, max_attempts=MAX_JOB_ATTEMPTS):
+        # Jobs left running by a dead worker (or, with worker_id=None, by a
+        # crashed or restarted pool) go back in line, or fail once they
+        # have been tried max_attempts times. Returns [(job_id, sid, status)].
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                query = "SELECT id, sid, attempts FROM jobs WHERE status = 'running'"
+                params = ()
+                if worker_id is not None:
+                    query += " AND worker = ?"
+                    params = (worker_id,)
+                jobs = []
+                for job_id, sid, attempts in self.conn.execute(query, params).fetchall():
+                    if attempts >= max_attempts:
+                        self.conn.execute(
+                            "UPDATE jobs SET status = 'failed', finished_at = ? WHERE id = ?", (time.time(), job_id)
+                        )
+                        jobs.append((job_id, sid, "failed"))
+                    else:
+                        self.conn.execute(
+                            "UPDATE jobs SET status = 'queued', worker = NULL, started_at = NULL WHERE id = ?",
+                            (job_id,),
+                        )
+                        jobs.append((job_id, sid, "queued"))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return jobs
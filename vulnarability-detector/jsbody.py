@@ -0,0 +1,123 @@
+import codecs
+import hashlib
+import mmap
+import tempfile
+
+MAX_JS_BYTES = 32 * 1024 * 1024
+SPOOL_BYTES = 1024 * 1024
+READ_CHUNK_BYTES = 64 * 1024
+
+
+class JSBody:
+    # A fetched script kept as raw bytes: in memory up to SPOOL_BYTES,
+    # beyond that spilled to an anonymous temp file and memory-mapped, so a
+    # large bundle never sits on the heap as bytes *and* decoded text.
+    # Bodies over MAX_JS_BYTES are truncated. view() is what the filter
+    # regexes run over; close() releases the file and mapping.
+
+    def __init__(self, encoding=None):
+        self.encoding = encoding or "utf-8"
+        self.buffer = bytearray()
+        self.file = None
+        self.map = None
+        self.size = 0
+        self.truncated = False
+        self.hasher = hashlib.sha256()
+        self.content_hash = None
+
+    @classmethod
+    def read(cls, response, max_bytes=MAX_JS_BYTES):
+        body = cls(response.encoding)
+        for data in response.iter_content(READ_CHUNK_BYTES):
+            if not body.write(data, max_bytes):
+                break
+        return body.finish()
+
+    @classmethod
+    def from_file(cls, path, encoding=None):
+        body = cls(encoding)
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(READ_CHUNK_BYTES)
+                if not data:
+                    break
+                body.write(data, None)
+        return body.finish()
+
+    def write(self, data, max_bytes=MAX_JS_BYTES):
+        if max_bytes is not None and self.size + len(data) > max_bytes:
+            data = data[:max_bytes - self.size]
+            self.truncated = True
+        self.hasher.update(data)
+        self.size += len(data)
+        if self.file is None and len(self.buffer) + len(data) > SPOOL_BYTES:
+            self.file = tempfile.TemporaryFile()
+            self.file.write(self.buffer)
+            self.buffer = bytearray()
+        if self.file is not None:
+            self.file.write(data)
+        else:
+            self.buffer += data
+        return not self.truncated
+
+    def finish(self):
+        self.content_hash = self.hasher.hexdigest()
+        if self.file is not None:
+            self.file.flush()
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def utf8(self):
+        try:
+            return codecs.lookup(self.encoding).name == "utf-8"
+        except LookupError:
+            return False
+
+    @property
+    def single_byte(self):
+        # ASCII-compatible with one character per byte (latin-1, cp1252,
+        # ...), so byte offsets are character offsets.
+        try:
+            decoder = codecs.getincrementaldecoder(self.encoding)(errors="replace")
+            chars = [decoder.decode(bytes([byte])) for byte in range(256)]
+        except (LookupError, TypeError, UnicodeError):
+            return False
+        return all(len(char) == 1 for char in chars) and "".join(chars[:128]) == bytes(range(128)).decode("ascii")
+
+    def view(self):
+        return self.map if self.map is not None else self.buffer
+
+    def decode(self, data):
+        return bytes(data).decode(self.encoding, errors="replace")
+
+    def text(self):
+        return self.decode(self.view())
+
+    def copy_to(self, f):
+        view = self.view()
+        for start in range(0, self.size, READ_CHUNK_BYTES):
+            f.write(view[start:start + READ_CHUNK_BYTES])
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.buffer = bytearray()
+
+
+def content_hash(code):
+    if isinstance(code, JSBody):
+        return code.content_hash
+    return hashlib.sha256(code.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def release(code):
+    if isinstance(code, JSBody):
+        code.close()
@@ -1,18 +1,80 @@
-import concurrent.futures
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import codecs
+import hashlib
+import threading
+import time
+import aiohttp
 from urllib.parse import urljoin, urlparse
 from urllib import robotparser
+from jsdiscovery import (
+    WELL_KNOWN_MANIFESTS,
+    extract_js_references,
+    next_build_manifest_url,
+    parse_json_manifest,
+    strip_fragment,
+)
+from urlpatterns import TemplateSampler, canonical_netloc, canonicalize_url
+from htmlscan import PageScanner, is_html_content_type, is_scanned_script
+
+PRELOAD_RELS = ("modulepreload", "preload", "prefetch")
+MAX_PAGE_BYTES = 2 * 1024 * 1024
+PAGE_CHUNK_SIZE = 64 * 1024
+
+
+class HostPoliteness:
+    # Next free request slot per host. The crawler keeps its own by default;
+    # scan worker processes share one through a multiprocessing manager so
+    # concurrent scans of the same site are paced together.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.host_last_request = {}
+
+    def reserve(self, host, delay):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.host_last_request.get(host, 0.0) + delay)
+            self.host_last_request[host] = slot
+        return slot - now
+
 
 class JSFileCrawler:
-    def __init__(self, base_url, headers=None, max_depth=1):
+    def __init__(self, base_url, headers=None, max_depth=1, concurrency=10,
+                 per_host_concurrency=5, politeness_delay=0.0, timeout=10, on_js_found=None,
+                 http_cache=None, politeness=None, manifest_depth=1, max_discovery_scripts=20,
+                 max_pages_per_template=3, stale_page_limit=50, max_page_bytes=MAX_PAGE_BYTES, deadline=None):
         self.base_url = base_url
-        self.domain = urlparse(base_url).netloc
+        # Canonical, like every link it is compared with: Example.com:443
+        # and example.com are the same site.
+        self.domain = canonical_netloc(urlparse(base_url))
         self.visited = set()
-        self.to_visit = [(base_url, 0)]
         self.headers = headers or {"User-Agent": "Mozilla/5.0"}
         self.max_depth = max_depth
+        self.concurrency = concurrency
+        self.per_host_concurrency = per_host_concurrency
+        self.politeness_delay = politeness_delay
+        self.timeout = timeout
+        self.on_js_found = on_js_found
+        self.http_cache = http_cache
+        self.manifest_depth = manifest_depth
+        self.max_discovery_scripts = max_discovery_scripts
         self.js_files = set()
+        self.inline_scripts = {}
+        self.inline_hashes = set()
+        self.next_build_manifests = set()
+        self.manifest_found = False
+        self.sampler = TemplateSampler(max_pages_per_template)
+        self.stale_page_limit = stale_page_limit
+        self.pages_since_new_js = 0
+        self.stopped_early = False
+        self.deadline = deadline
+        self.max_page_bytes = max_page_bytes
+        self.pages_crawled = 0
+        self.pages_skipped = 0
+        self.pages_truncated = 0
+        self.pages_per_second = 0.0
+        self.lock = threading.Lock()
+        self.politeness = politeness if politeness is not None else HostPoliteness()
         self.robots_parser = self.get_robots_parser()
 
     def get_robots_parser(self):
@@ -25,42 +87,293 @@ class JSFileCrawler:
         return rp
 
     def is_valid_url(self, url):
-        return urlparse(url).netloc == self.domain and self.robots_parser.can_fetch(self.headers['User-Agent'], url)
+        return canonical_netloc(urlparse(url)) == self.domain and self.robots_parser.can_fetch(self.headers['User-Agent'], url)
 
     def crawl(self):
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            while self.to_visit:
-                batch = []
-                while self.to_visit and len(batch) < 5:
-                    url, depth = self.to_visit.pop()
-                    if depth <= self.max_depth and url not in self.visited:
-                        self.visited.add(url)
-                        batch.append((url, depth))
-                futures = [executor.submit(self.process_url, url, depth) for url, depth in batch]
-                concurrent.futures.wait(futures)
-
-        return sorted(self.js_files)
-
-    def process_url(self, url, depth):
+        return asyncio.run(self.crawl_async())
+
+    async def crawl_async(self):
+        started = time.monotonic()
+        frontier = asyncio.Queue()
+        self.mark_visited(canonicalize_url(self.base_url))
+        self.sampler.admit(canonicalize_url(self.base_url))
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host_concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(headers=self.headers, connector=connector, timeout=timeout) as session:
+            # Manifest-first: list the build from the landing page's scripts
+            # and known manifests, and only fall back to a deep HTML crawl
+            # when no manifest or chunk table turns up.
+            await self.process_url(session, frontier, self.base_url, 0)
+            await self.discover(session)
+            if self.manifest_found:
+                print(f"📜 Build manifest found, limiting HTML crawl to depth {self.crawl_depth()}")
+
+            workers = [
+                asyncio.create_task(self.worker(session, frontier))
+                for _ in range(self.concurrency)
+            ]
+            await frontier.join()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        elapsed = time.monotonic() - started
+        self.pages_per_second = self.pages_crawled / elapsed if elapsed > 0 else 0.0
+        print(f"🕷️ Crawled {self.pages_crawled} pages in {elapsed:.2f}s ({self.pages_per_second:.1f} pages/s)")
+        if self.pages_skipped or self.pages_truncated:
+            print(f"📄 {self.pages_skipped} non-HTML response(s) skipped, {self.pages_truncated} page(s) truncated")
+        if self.sampler.skipped:
+            print(f"🧩 Skipped {self.sampler.skipped} link(s) to already-sampled page templates")
+        return self.get_js_files()
+
+    async def worker(self, session, frontier):
+        while True:
+            url, depth = await frontier.get()
+            try:
+                await self.process_url(session, frontier, url, depth)
+            finally:
+                frontier.task_done()
+
+    async def wait_politely(self, host):
+        if not self.politeness_delay:
+            return
+        wait = await asyncio.to_thread(self.politeness.reserve, host, self.politeness_delay)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def process_url(self, session, frontier, url, depth):
+        if self.stopped_early or self.out_of_time():
+            return
         print(f"🕷️ Crawling: {url}")
         try:
-            html = requests.get(url, headers=self.headers, timeout=10).text
-            soup = BeautifulSoup(html, "lxml")
-            self.extract_scripts(soup, url)
-            self.extract_links(soup, url, depth)
+            await self.wait_politely(urlparse(url).netloc)
+            page = await self.scan_page(session, url)
+            with self.lock:
+                self.pages_crawled += 1
+            if page is None:
+                return
+            new_scripts = self.extract_scripts(page)
+            self.track_staleness(bool(new_scripts))
+            if depth < self.crawl_depth():
+                self.extract_links(page, frontier, depth)
+            if self.on_js_found:
+                for js_url in new_scripts:
+                    await asyncio.to_thread(self.on_js_found, js_url)
         except Exception as e:
             print(f"Error crawling {url}: {e}")
 
-    def extract_links(self, soup, current_url, depth):
-        for tag in soup.find_all("a", href=True):
-            href = tag.get("href")
-            full_url = urljoin(current_url, href)
-            if self.is_valid_url(full_url) and full_url not in self.visited:
-                self.to_visit.append((full_url, depth + 1))
-
-    def extract_scripts(self, soup, current_url):
-        for script in soup.find_all("script", src=True):
-            src = script.get("src")
-            full_url = urljoin(current_url, src)
-            if full_url.endswith(".js") and self.is_valid_url(full_url):
-                self.js_files.add(full_url)
+    def track_staleness(self, found_new_js):
+        # Stop once stale_page_limit pages in a row have turned up no new JS;
+        # queued pages are then drained without being fetched.
+        with self.lock:
+            self.pages_since_new_js = 0 if found_new_js else self.pages_since_new_js + 1
+            if self.stale_page_limit and self.pages_since_new_js >= self.stale_page_limit and not self.stopped_early:
+                self.stopped_early = True
+                print(f"🛑 No new JS in the last {self.pages_since_new_js} pages, stopping crawl early")
+
+    def out_of_time(self):
+        # Past the (quick scan) deadline: stop like a stale crawl does.
+        if not self.deadline or time.monotonic() < self.deadline:
+            return False
+        with self.lock:
+            if not self.stopped_early:
+                self.stopped_early = True
+                print("⏱️ Crawl time budget used up, stopping crawl")
+        return True
+
+    def crawl_depth(self):
+        return min(self.max_depth, self.manifest_depth) if self.manifest_found else self.max_depth
+
+    async def discover(self, session):
+        candidates = [urljoin(self.base_url, path) for path in WELL_KNOWN_MANIFESTS]
+        for manifest_url in candidates + sorted(self.next_build_manifests):
+            text = await self.fetch_asset(session, manifest_url)
+            if text is None:
+                continue
+            if manifest_url.endswith(".json"):
+                found, listed = parse_json_manifest(text, manifest_url), True
+            else:
+                found, listed = extract_js_references(text, manifest_url)
+            await self.add_discovered(found)
+            if found and listed:
+                self.manifest_found = True
+
+        # Entry and runtime scripts hold import() paths and webpack chunk
+        # tables; follow them breadth-first up to max_discovery_scripts.
+        pending = self.get_js_files()
+        inspected = set()
+        while pending and len(inspected) < self.max_discovery_scripts:
+            js_url = pending.pop(0)
+            if js_url in inspected:
+                continue
+            inspected.add(js_url)
+            code = self.inline_scripts.get(js_url) or await self.fetch_asset(session, js_url)
+            if code is None:
+                continue
+            found, listed = extract_js_references(code, js_url)
+            pending.extend(await self.add_discovered(found))
+            if found and listed:
+                self.manifest_found = True
+
+    async def fetch_asset(self, session, url):
+        # Manifests and scripts only; error pages come back as HTML.
+        try:
+            await self.wait_politely(urlparse(url).netloc)
+            text = await self.fetch_page(session, url)
+        except Exception:
+            return None
+        return None if text.lstrip().startswith("<") else text
+
+    async def add_discovered(self, urls):
+        new_urls = [url for url in urls if self.is_valid_url(url) and self.add_js(url)]
+        if self.on_js_found:
+            for js_url in new_urls:
+                await asyncio.to_thread(self.on_js_found, js_url)
+        return new_urls
+
+    async def scan_page(self, session, url):
+        headers = self.http_cache.conditional_headers(url) if self.http_cache else None
+        async with session.get(url, headers=headers) as response:
+            if response.status != 304:
+                return await self.stream_page(url, response)
+            cached = self.http_cache.load(url)
+            if cached is not None:
+                page = PageScanner(str(response.url))
+                page.feed(cached)
+                page.close()
+                return page
+
+        async with session.get(url) as response:
+            return await self.stream_page(url, response)
+
+    async def stream_page(self, url, response):
+        # Checks Content-Type before reading anything, then feeds the body to
+        # the tag scanner chunk by chunk and stops at max_page_bytes.
+        if not is_html_content_type(response.headers.get("Content-Type")):
+            with self.lock:
+                self.pages_skipped += 1
+            return None
+
+        encoding = response.charset or "utf-8"
+        try:
+            decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        except LookupError:
+            encoding = "utf-8"
+            decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+
+        page = PageScanner(str(response.url))
+        body = [] if self.http_cache and response.status == 200 else None
+        size = 0
+        async for chunk in response.content.iter_chunked(PAGE_CHUNK_SIZE):
+            remaining = self.max_page_bytes - size
+            truncated = len(chunk) > remaining
+            chunk = chunk[:remaining]
+            size += len(chunk)
+            page.feed(decoder.decode(chunk))
+            if body is not None:
+                body.append(chunk)
+            if truncated:
+                with self.lock:
+                    self.pages_truncated += 1
+                body = None
+                break
+        page.feed(decoder.decode(b"", final=True))
+        page.close()
+
+        if body is not None:
+            self.http_cache.store(url, response.headers, b"".join(body), encoding)
+        return page
+
+    async def fetch_page(self, session, url):
+        if not self.http_cache:
+            async with session.get(url) as response:
+                return await response.text(errors="replace")
+
+        async with session.get(url, headers=self.http_cache.conditional_headers(url)) as response:
+            if response.status == 304:
+                cached = self.http_cache.load(url)
+                if cached is not None:
+                    return cached
+            else:
+                body = await response.read()
+                encoding = response.get_encoding()
+                if response.status == 200:
+                    self.http_cache.store(url, response.headers, body, encoding)
+                return body.decode(encoding, errors="replace")
+
+        async with session.get(url) as response:
+            return await response.text(errors="replace")
+
+    def mark_visited(self, url):
+        with self.lock:
+            if url in self.visited:
+                return False
+            self.visited.add(url)
+            return True
+
+    def get_js_files(self):
+        with self.lock:
+            return sorted(self.js_files)
+
+    def extract_links(self, page, frontier, depth):
+        # The canonical URL is only the visited/template key; the link is
+        # fetched as written, resolved against the page's final URL.
+        base_url = page.base_url()
+        for href in page.links:
+            if self.stopped_early:
+                return
+            full_url = strip_fragment(urljoin(base_url, href))
+            key = canonicalize_url(full_url)
+            if self.is_valid_url(full_url) and self.mark_visited(key) and self.sampler.admit(key):
+                frontier.put_nowait((full_url, depth + 1))
+
+    def add_js(self, js_url):
+        with self.lock:
+            if js_url in self.js_files:
+                return False
+            self.js_files.add(js_url)
+            return True
+
+    def add_inline_script(self, code, current_url):
+        # Inline bodies get a stable pseudo-URL on the first page they were
+        # seen on; the same snippet repeated on every page is kept once.
+        digest = hashlib.sha1(code.encode("utf-8", "surrogatepass")).hexdigest()[:16]
+        with self.lock:
+            if digest in self.inline_hashes:
+                return None
+            self.inline_hashes.add(digest)
+            js_url = f"{strip_fragment(current_url)}#inline-{digest}"
+            self.inline_scripts[js_url] = code
+            self.js_files.add(js_url)
+        return js_url
+
+    def extract_scripts(self, page):
+        base_url = page.base_url()
+        candidates = [urljoin(base_url, src) for src in page.script_srcs]
+        for attrs, code in page.inline_scripts:
+            if not code.strip():
+                continue
+            if attrs.get("id") == "__NEXT_DATA__":
+                manifest_url = next_build_manifest_url(code, base_url)
+                if manifest_url:
+                    self.next_build_manifests.add(manifest_url)
+            if not is_scanned_script(attrs):
+                continue
+            inline_url = self.add_inline_script(code, page.url)
+            if inline_url:
+                candidates.append(inline_url)
+
+        for rel, kind, href in page.preloads:
+            if "modulepreload" in rel or (any(r in PRELOAD_RELS for r in rel) and kind == "script"):
+                candidates.append(urljoin(base_url, href))
+
+        new_scripts = []
+        for full_url in candidates:
+            if "#inline-" in full_url:
+                new_scripts.append(full_url)
+            else:
+                full_url = strip_fragment(full_url)
+                if self.is_valid_url(full_url) and self.add_js(full_url):
+                    new_scripts.append(full_url)
+        return new_scripts
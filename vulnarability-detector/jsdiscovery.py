@@ -0,0 +1,104 @@
+import json
+import re
+from urllib.parse import urljoin, urlparse
+
+JS_EXTENSIONS = (".js", ".mjs", ".cjs")
+WELL_KNOWN_MANIFESTS = ("/.vite/manifest.json", "/asset-manifest.json", "/manifest.json")
+NEXT_BUILD_MANIFEST = "/_next/static/{build_id}/_buildManifest.js"
+
+# Quoted relative or absolute paths to JS files: import("./x.js"), Vite's
+# __vite__mapDeps(["assets/x.js"]), Next's "static/chunks/x.js" lists, etc.
+JS_PATH_PATTERN = re.compile(r"""["'`]((?:\.{1,2}/|/)?[\w\-.@~]+/[\w\-./@~]*?\.[cm]?js(?:\?[^"'`\s]*)?)["'`]""")
+PUBLIC_PATH_PATTERN = re.compile(r"""\.p\s*=\s*["']([^"']*)["']""")
+# webpack's chunk filename function, e.g.
+#   "static/chunks/"+(({12:"app"})[e]||e)+"."+{12:"3f2a",40:"9bc1"}[e]+".js"
+CHUNK_MAP_PATTERN = re.compile(
+    r"""["']([\w\-./]*)["']\s*\+\s*"""
+    r"""(?:\(\s*\(?\s*(\{[^{}]*\})\s*\)?\s*\[\s*\w+\s*\]\s*\|\|\s*\w+\s*\)|\w+)\s*\+\s*"""
+    r"""["']([\w\-.]*)["']\s*\+\s*\(?\s*(\{[^{}]*\})\s*\)?\s*\[\s*\w+\s*\]\s*\+\s*"""
+    r"""["']([\w\-.]*\.[cm]?js)["']"""
+)
+MAP_ENTRY_PATTERN = re.compile(r"""(?:"([^"]+)"|'([^']+)'|([\w$]+))\s*:\s*["']([^"']+)["']""")
+
+
+def is_js_url(url):
+    return urlparse(url).path.endswith(JS_EXTENSIONS)
+
+
+def strip_fragment(url):
+    return url.split("#", 1)[0]
+
+
+def public_path(js_code, js_url):
+    # Where webpack resolves bare chunk paths from: its runtime's
+    # __webpack_require__.p, Next's /_next/ prefix, or the site root.
+    match = PUBLIC_PATH_PATTERN.search(js_code)
+    if match and match.group(1) not in ("", "auto"):
+        return urljoin(js_url, match.group(1))
+    if "/_next/" in js_url:
+        return js_url[:js_url.index("/_next/") + len("/_next/")]
+    return urljoin(js_url, "/")
+
+
+def resolve_js_path(path, js_url, base):
+    if path.startswith(("./", "../")):
+        return urljoin(js_url, path)
+    return urljoin(base, path)
+
+
+def parse_map(text):
+    return {
+        key or quoted or bare: value
+        for key, quoted, bare, value in MAP_ENTRY_PATTERN.findall(text)
+    }
+
+
+def extract_chunk_map_urls(js_code, base):
+    urls = []
+    for prefix, names, middle, hashes, suffix in CHUNK_MAP_PATTERN.findall(js_code):
+        names = parse_map(names) if names else {}
+        for chunk_id, chunk_hash in parse_map(hashes).items():
+            urls.append(urljoin(base, f"{prefix}{names.get(chunk_id, chunk_id)}{middle}{chunk_hash}{suffix}"))
+    return urls
+
+
+def extract_js_references(js_code, js_url):
+    # Returns (urls, listed): every JS URL the code points to, and whether it
+    # held a chunk table that enumerates the build (so crawling is optional).
+    base = public_path(js_code, js_url)
+    chunk_urls = extract_chunk_map_urls(js_code, base)
+    urls = chunk_urls + [resolve_js_path(path, js_url, base) for path in JS_PATH_PATTERN.findall(js_code)]
+    listed = bool(chunk_urls) or "__BUILD_MANIFEST" in js_code
+    return [strip_fragment(url) for url in dict.fromkeys(urls)], listed
+
+
+def parse_json_manifest(text, manifest_url):
+    # Vite's manifest.json ({entry: {"file": ...}}) or CRA's
+    # asset-manifest.json ({"files": {...}, "entrypoints": [...]}).
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return []
+    root = urljoin(manifest_url, "/")
+    if isinstance(data, dict) and any(isinstance(v, dict) and "file" in v for v in data.values()):
+        paths = [v["file"] for v in data.values() if isinstance(v, dict) and isinstance(v.get("file"), str)]
+    else:
+        paths = []
+        stack = [data]
+        while stack:
+            value = stack.pop()
+            if isinstance(value, dict):
+                stack.extend(value.values())
+            elif isinstance(value, list):
+                stack.extend(value)
+            elif isinstance(value, str):
+                paths.append(value)
+    return list(dict.fromkeys(url for url in (urljoin(root, path) for path in paths) if is_js_url(url)))
+
+
+def next_build_manifest_url(next_data, page_url):
+    try:
+        build_id = json.loads(next_data).get("buildId")
+    except (ValueError, AttributeError):
+        return None
+    return urljoin(page_url, NEXT_BUILD_MANIFEST.format(build_id=build_id)) if build_id else None
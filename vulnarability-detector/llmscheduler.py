@@ -0,0 +1,220 @@
+import os
+import random
+import re
+import threading
+import time
+from google import genai
+from metrics import metrics
+
+DEFAULT_MODEL = "gemini-1.5-flash"
+DEFAULT_REQUESTS_PER_MINUTE = 15
+BURST_SECONDS = 4
+BASE_BACKOFF = 2.0
+MAX_BACKOFF = 60.0
+
+RETRY_DELAY_PATTERN = re.compile(r"retry[_ ]?delay[\"']?\s*[:=]\s*[\"']?(\d+(?:\.\d+)?)s", re.IGNORECASE)
+
+
+def is_rate_limit(error):
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return code == 429 or "429" in str(error) or "RESOURCE_EXHAUSTED" in str(error)
+
+
+def retry_after_seconds(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    match = RETRY_DELAY_PATTERN.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+class KeyBuckets:
+    # Token bucket and cooldown per key, kept apart from the clients so one
+    # instance can be served by a multiprocessing manager and shared by every
+    # scan worker process; quotas are per key, not per process.
+
+    def __init__(self, quotas):
+        self.lock = threading.Lock()
+        now = time.monotonic()
+        self.buckets = []
+        for requests_per_minute in quotas:
+            rate = requests_per_minute / 60.0
+            capacity = max(1.0, rate * BURST_SECONDS)
+            self.buckets.append({
+                "rate": rate,
+                "capacity": capacity,
+                "tokens": capacity,
+                "updated": now,
+                "blocked_until": 0.0,
+                "failures": 0,
+            })
+
+    def ready_at(self, bucket, now):
+        bucket["tokens"] = min(bucket["capacity"], bucket["tokens"] + (now - bucket["updated"]) * bucket["rate"])
+        bucket["updated"] = now
+        if bucket["blocked_until"] > now:
+            return bucket["blocked_until"]
+        if bucket["tokens"] >= 1:
+            return now
+        return now + (1 - bucket["tokens"]) / bucket["rate"]
+
+    def reserve(self):
+        # Returns (index, 0) with a token taken, or (None, seconds to wait).
+        with self.lock:
+            now = time.monotonic()
+            index = min(
+                range(len(self.buckets)),
+                key=lambda i: (self.ready_at(self.buckets[i], now), -self.buckets[i]["tokens"]),
+            )
+            ready = self.ready_at(self.buckets[index], now)
+            if ready <= now:
+                self.buckets[index]["tokens"] -= 1
+                return index, 0.0
+            return None, ready - now
+
+    def rate_limited(self, index, retry_after):
+        with self.lock:
+            bucket = self.buckets[index]
+            bucket["failures"] += 1
+            delay = retry_after or min(MAX_BACKOFF, BASE_BACKOFF * 2 ** (bucket["failures"] - 1))
+            bucket["blocked_until"] = time.monotonic() + delay * random.uniform(1.0, 1.2)
+            bucket["tokens"] = 0
+
+    def succeeded(self, index):
+        with self.lock:
+            self.buckets[index]["failures"] = 0
+
+
+class ConcurrencyLimit:
+    # Cap on in-flight LLM calls. Like KeyBuckets it can be served by a
+    # multiprocessing manager so the cap holds for the whole worker pool.
+    # Slots are held per owner (a process id), so the slots of a worker that
+    # died mid-call can be handed back with release_owner().
+
+    def __init__(self, slots):
+        self.slots = slots
+        self.condition = threading.Condition()
+        self.holders = {}
+
+    def acquire(self, owner):
+        with self.condition:
+            while sum(self.holders.values()) >= self.slots:
+                self.condition.wait()
+            self.holders[owner] = self.holders.get(owner, 0) + 1
+
+    def release(self, owner):
+        with self.condition:
+            if self.holders.get(owner, 0) > 1:
+                self.holders[owner] -= 1
+            else:
+                self.holders.pop(owner, None)
+            self.condition.notify()
+
+    def release_owner(self, owner):
+        with self.condition:
+            if self.holders.pop(owner, None):
+                self.condition.notify_all()
+
+
+def parse_keys(keys):
+    return [key if isinstance(key, (tuple, list)) else (key, DEFAULT_REQUESTS_PER_MINUTE) for key in keys]
+
+
+class KeySlot:
+    def __init__(self, index, api_key, model_name):
+        self.index = index
+        self.api_key = api_key
+        self.model_name = model_name
+        self.client = genai.Client(api_key=api_key)
+
+    def generate(self, prompt):
+        response = self.client.models.generate_content(model=self.model_name, contents=prompt)
+        usage = getattr(response, "usage_metadata", None)
+        if usage:
+            metrics.inc("guardex_llm_tokens_total", usage.prompt_token_count or 0, provider="gemini", kind="prompt")
+            metrics.inc("guardex_llm_tokens_total", usage.candidates_token_count or 0, provider="gemini", kind="completion")
+        return response.text
+
+
+class GeminiScheduler:
+    # One instance per process. Every key gets its own client and a token
+    # bucket sized to its quota; 429s put the key on cooldown (honouring the
+    # server's retry delay) instead of hammering the next key immediately.
+    # Pass shared KeyBuckets and ConcurrencyLimit proxies to pace keys and
+    # cap concurrent calls across processes.
+
+    def __init__(self, keys, model_name=DEFAULT_MODEL, max_concurrency=8, max_attempts=None, buckets=None,
+                 concurrency=None):
+        keys = parse_keys(keys)
+        self.slots = [KeySlot(i, api_key, model_name) for i, (api_key, _) in enumerate(keys)]
+        if buckets is None:
+            buckets = KeyBuckets([requests_per_minute for _, requests_per_minute in keys])
+        self.buckets = buckets
+        self.max_attempts = max_attempts or max(3, 2 * len(self.slots))
+        self.lock = threading.Lock()
+        if concurrency is None:
+            concurrency = ConcurrencyLimit(max_concurrency)
+        self.concurrency = concurrency
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0, "rotations": 0, "errors": 0}
+
+    def acquire(self):
+        while True:
+            index, wait = self.buckets.reserve()
+            if index is not None:
+                return self.slots[index]
+            time.sleep(wait)
+
+    def report_rate_limit(self, slot, retry_after):
+        self.buckets.rate_limited(slot.index, retry_after)
+        with self.lock:
+            self.stats["rate_limited"] += 1
+            self.stats["rotations"] += 1
+        metrics.inc("guardex_llm_rate_limited_total", provider="gemini")
+        metrics.inc("guardex_llm_key_rotations_total", provider="gemini")
+
+    def report_success(self, slot):
+        self.buckets.succeeded(slot.index)
+        with self.lock:
+            self.stats["requests"] += 1
+
+    def call(self, slot, prompt):
+        owner = os.getpid()
+        self.concurrency.acquire(owner)
+        try:
+            with metrics.span("guardex_upstream_seconds", provider="gemini", model=slot.model_name):
+                return slot.generate(prompt)
+        finally:
+            self.concurrency.release(owner)
+
+    def generate(self, prompt):
+        if not self.slots:
+            raise RuntimeError("No Gemini API keys configured")
+
+        last_error = None
+        for attempt in range(self.max_attempts):
+            if attempt:
+                with self.lock:
+                    self.stats["retries"] += 1
+                metrics.inc("guardex_llm_retries_total", provider="gemini")
+            slot = self.acquire()
+            try:
+                text = self.call(slot, prompt)
+                self.report_success(slot)
+                return text
+            except Exception as e:
+                last_error = e
+                if is_rate_limit(e):
+                    print(f"⏳ Gemini key {slot.api_key[-4:]} rate limited, cooling down")
+                    self.report_rate_limit(slot, retry_after_seconds(e))
+                else:
+                    print(f"⚠️ Gemini call failed: {e}")
+                    with self.lock:
+                        self.stats["errors"] += 1
+                    metrics.inc("guardex_upstream_errors_total", provider="gemini")
+                    time.sleep(min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt) * random.random())
+        raise last_error
@@ -0,0 +1,156 @@
+import atexit
+import glob
+import json
+import os
+import queue
+import random
+import threading
+import time
+import httpx
+from findingscache import CACHE_DIR
+from metrics import metrics
+
+JOURNAL_DIR = os.path.join(CACHE_DIR, "supabase-journal")
+WRITE_QUEUE_SIZE = 1000
+BATCH_SIZE = 200
+BATCH_INTERVAL = 2.0
+MAX_ATTEMPTS = 5
+BASE_BACKOFF = 0.5
+MAX_BACKOFF = 10.0
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class PersistenceUnavailable(Exception):
+    pass
+
+
+class SupabaseStore:
+    # One keep-alive client per process for Supabase's REST API. Reads go
+    # straight through request(); writes are queued to a single background
+    # writer that folds row upserts into one bulk request per table every
+    # BATCH_INTERVAL (or BATCH_SIZE rows), keeping queued writes in order.
+    # Writes that still fail after retries are journaled to disk and
+    # replayed on the next start instead of being dropped.
+
+    def __init__(self, supabase_url, supabase_key, journal_dir=JOURNAL_DIR):
+        self.client = httpx.Client(
+            base_url=f"{supabase_url}/rest/v1",
+            headers={
+                "apikey": supabase_key,
+                "Authorization": f"Bearer {supabase_key}",
+                "Content-Type": "application/json",
+            },
+            timeout=httpx.Timeout(15.0),
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
+        )
+        self.journal_dir = journal_dir
+        self.journal_path = os.path.join(journal_dir, f"pending-{os.getpid()}.jsonl")
+        self.journal_lock = threading.Lock()
+        self.writes = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+        self.replay_journal()
+        atexit.register(self.flush)
+
+    def request(self, method, path, operation, **kwargs):
+        last_error = None
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                with metrics.span("guardex_upstream_seconds", provider="supabase", operation=operation):
+                    response = self.client.request(method, path, **kwargs)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response
+                last_error = f"HTTP {response.status_code}: {response.text[:200]}"
+            except httpx.TransportError as e:
+                last_error = e
+            metrics.inc("guardex_upstream_retries_total", provider="supabase", operation=operation)
+            time.sleep(min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt) * random.uniform(0.5, 1.0))
+        raise PersistenceUnavailable(f"Supabase {operation} failed after {MAX_ATTEMPTS} attempts: {last_error}")
+
+    def upsert(self, table, row, on_conflict):
+        self.writes.put({"kind": "upsert", "table": table, "on_conflict": on_conflict, "rows": [row]})
+
+    def patch(self, table, filters, values):
+        self.writes.put({"kind": "patch", "table": table, "filters": filters, "values": values})
+
+    def flush(self, timeout=60):
+        done = threading.Event()
+        self.writes.put({"kind": "barrier", "event": done})
+        return done.wait(timeout)
+
+    def write_loop(self):
+        batches = {}
+        pending_rows = 0
+        deadline = None
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if deadline else None
+            try:
+                op = self.writes.get(timeout=timeout)
+            except queue.Empty:
+                op = None
+
+            if op and op["kind"] == "upsert":
+                batches.setdefault((op["table"], op["on_conflict"]), []).extend(op["rows"])
+                pending_rows += len(op["rows"])
+                deadline = deadline or time.monotonic() + BATCH_INTERVAL
+                if pending_rows < BATCH_SIZE:
+                    continue
+
+            # Batch full, interval elapsed or an ordered write: rows go first.
+            for (table, on_conflict), rows in batches.items():
+                self.apply({"kind": "upsert", "table": table, "on_conflict": on_conflict, "rows": rows})
+            batches, pending_rows, deadline = {}, 0, None
+
+            if op is None or op["kind"] == "upsert":
+                continue
+            if op["kind"] == "barrier":
+                op["event"].set()
+            else:
+                self.apply(op)
+
+    def apply(self, op):
+        try:
+            if op["kind"] == "upsert":
+                self.request(
+                    "POST",
+                    f"/{op['table']}",
+                    f"upsert_{op['table']}",
+                    params={"on_conflict": op["on_conflict"]},
+                    headers={"Prefer": "resolution=merge-duplicates"},
+                    json=op["rows"],
+                )
+            else:
+                self.request(
+                    "PATCH",
+                    f"/{op['table']}",
+                    f"patch_{op['table']}",
+                    params={key: f"eq.{value}" for key, value in op["filters"].items()},
+                    json=op["values"],
+                )
+        except PersistenceUnavailable as e:
+            print(f"💾 {e}; journaling the write for replay")
+            self.journal(op)
+        except Exception as e:
+            print(f"Error writing to {op['table']}:", e)
+
+    def journal(self, op):
+        with self.journal_lock:
+            os.makedirs(self.journal_dir, exist_ok=True)
+            with open(self.journal_path, "a") as f:
+                f.write(json.dumps(op) + "\n")
+
+    def replay_journal(self):
+        # Claim each journal by renaming it so only one process replays it.
+        for path in glob.glob(os.path.join(self.journal_dir, "pending-*.jsonl")):
+            claimed = os.path.join(self.journal_dir, f"replaying-{os.getpid()}-{os.path.basename(path)}")
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            with open(claimed) as f:
+                ops = [json.loads(line) for line in f if line.strip()]
+            print(f"💾 Replaying {len(ops)} journaled Supabase write(s)")
+            for op in ops:
+                self.writes.put(op)
+            os.remove(claimed)
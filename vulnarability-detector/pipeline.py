@@ -0,0 +1,293 @@
+import hashlib
+import itertools
+import queue
+import threading
+import time
+
+_STOP = object()
+
+PACK_MAX_WAIT = 1.0
+PACK_SMALL_RATIO = 0.5
+
+
+def content_fingerprint(js_code):
+    return hashlib.sha256(js_code.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+class ChunkTask:
+    def __init__(self, js_url, index, code):
+        self.js_url = js_url
+        self.index = index
+        self.code = code
+        self.tokens = 0
+        self.score = 0.0
+        self.local_findings = []
+
+
+# Crawl → fetch → filter/chunk → LLM stages joined by bounded queues.
+# URLs are submit()ted while the crawl is still running and every file
+# shares the same pool of LLM workers. Chunks that triage() cannot resolve
+# locally go to the LLM; small ones are first bin-packed with chunks from
+# other files, up to pack_budget, so they share a single request. Files
+# whose content hash reuse() recognises skip analysis entirely. prepare()
+# may be a generator: each chunk is dispatched as soon as it is produced,
+# and whatever fetch() returned is handed to release() once the last one
+# is out. A file that fails mid-way keeps the chunks already dispatched
+# and is counted as partially covered. With a
+# dedup index, copies of a chunk already headed for the LLM wait for that
+# one analysis and get its findings through share() (or are analyzed on
+# their own when share() declines). LLM requests are served highest
+# task.score first; with a budget, requests it no longer admits are skipped
+# (local findings only) and their files counted as partially covered.
+class ScanPipeline:
+    def __init__(self, fetch, prepare, analyze, triage=None, reuse=None, measure=len, pack_budget=0,
+                 fetch_workers=4, llm_workers=8, queue_size=64, fingerprint=None, release=None,
+                 dedup=None, share=None, budget=None,
+                 on_chunk_start=None, on_file_done=None, on_chunk_done=None, on_error=None):
+        self.fetch = fetch
+        self.fingerprint = fingerprint or content_fingerprint
+        self.release = release
+        self.prepare = prepare
+        self.analyze = analyze
+        self.triage = triage
+        self.reuse = reuse
+        self.dedup = dedup
+        self.share = share
+        self.budget = budget
+        self.measure = measure
+        self.pack_budget = pack_budget
+        self.on_chunk_start = on_chunk_start
+        self.on_file_done = on_file_done
+        self.on_chunk_done = on_chunk_done
+        self.on_error = on_error
+        self.url_queue = queue.Queue(maxsize=queue_size)
+        self.pack_queue = queue.Queue(maxsize=queue_size)
+        self.chunk_queue = queue.PriorityQueue(maxsize=queue_size)
+        self.order = itertools.count()
+        self.lock = threading.Lock()
+        self.seen_urls = set()
+        self.pending_chunks = {}
+        self.file_results = {}
+        self.file_hashes = {}
+        self.files_started = 0
+        self.files_reused = 0
+        self.llm_requests = 0
+        self.chunks_analyzed = 0
+        self.chunks_skipped = 0
+        self.files_skipped = 0
+        self.partial_files = set()
+        self.results = []
+        self.fetch_threads = [
+            threading.Thread(target=self.fetch_worker, daemon=True) for _ in range(fetch_workers)
+        ]
+        self.pack_thread = threading.Thread(target=self.pack_worker, daemon=True)
+        self.llm_threads = [
+            threading.Thread(target=self.llm_worker, daemon=True) for _ in range(llm_workers)
+        ]
+        for thread in self.fetch_threads + [self.pack_thread] + self.llm_threads:
+            thread.start()
+
+    def submit(self, js_url):
+        with self.lock:
+            if js_url in self.seen_urls:
+                return
+            self.seen_urls.add(js_url)
+        self.url_queue.put(js_url)
+
+    def close(self):
+        for _ in self.fetch_threads:
+            self.url_queue.put(_STOP)
+
+    def join(self):
+        for thread in self.fetch_threads:
+            thread.join()
+        self.pack_queue.put(_STOP)
+        self.pack_thread.join()
+        for _ in self.llm_threads:
+            self.chunk_queue.put((float("inf"), next(self.order), _STOP))
+        for thread in self.llm_threads:
+            thread.join()
+        return self.results
+
+    def fetch_worker(self):
+        while True:
+            js_url = self.url_queue.get()
+            if js_url is _STOP:
+                return
+            if self.budget and self.budget.exhausted():
+                with self.lock:
+                    self.files_skipped += 1
+                continue
+            js_code = None
+            started = False
+            try:
+                js_code = self.fetch(js_url)
+                content_hash = self.fingerprint(js_code)
+                carried = self.reuse(js_url, content_hash) if self.reuse else None
+                self.start_file(js_url, content_hash, carried)
+                started = True
+                if carried is None:
+                    for i, chunk in enumerate(self.prepare(js_code)):
+                        task = ChunkTask(js_url, i, chunk)
+                        with self.lock:
+                            self.pending_chunks[js_url] += 1
+                        if self.on_chunk_start:
+                            self.on_chunk_start(task)
+                        self.dispatch(task)
+            except Exception as e:
+                if started:
+                    with self.lock:
+                        self.partial_files.add(js_url)
+                self.report_error(js_url, e)
+            finally:
+                if self.release and js_code is not None:
+                    self.release(js_code)
+                if started:
+                    self.settle(js_url)
+
+    def start_file(self, js_url, content_hash, carried):
+        # pending_chunks starts at 1, held until the file's last chunk has
+        # been dispatched, so the file cannot finish while it is still being
+        # chunked.
+        with self.lock:
+            self.files_started += 1
+            self.pending_chunks[js_url] = 1
+            self.file_results[js_url] = []
+            self.file_hashes[js_url] = content_hash
+            if carried is not None:
+                self.files_reused += 1
+                self.results.extend(carried)
+                self.file_results[js_url].extend(carried)
+
+    def settle(self, js_url):
+        with self.lock:
+            self.pending_chunks[js_url] -= 1
+            done = self.pending_chunks[js_url] == 0
+        if done:
+            self.finish_file(js_url)
+
+    def dispatch(self, task):
+        findings = None
+        if self.triage:
+            try:
+                findings = self.triage(task)
+            except Exception as e:
+                self.report_error(task.js_url, e)
+        if findings is not None:
+            self.record(task, findings)
+            return
+
+        task.tokens = self.measure(task.code)
+        if self.dedup:
+            leader, findings = self.dedup.claim(task)
+            if leader is not None:
+                if findings is not None:
+                    self.share_findings(leader, findings, [task])
+                return
+
+        if self.pack_budget and task.tokens < self.pack_budget * PACK_SMALL_RATIO:
+            self.pack_queue.put(task)
+        else:
+            self.enqueue_llm([task])
+
+    def enqueue_llm(self, tasks):
+        self.chunk_queue.put((-max(task.score for task in tasks), next(self.order), tasks))
+
+    def pack_worker(self):
+        pack = []
+        pack_tokens = 0
+        deadline = None
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if deadline else None
+            try:
+                task = self.pack_queue.get(timeout=timeout)
+            except queue.Empty:
+                task = None
+
+            if task is None or task is _STOP or pack_tokens + task.tokens > self.pack_budget:
+                if pack:
+                    self.enqueue_llm(pack)
+                pack, pack_tokens, deadline = [], 0, None
+            if task is _STOP:
+                return
+            if task is not None:
+                pack.append(task)
+                pack_tokens += task.tokens
+                deadline = deadline or time.monotonic() + PACK_MAX_WAIT
+
+    def llm_worker(self):
+        while True:
+            _, _, tasks = self.chunk_queue.get()
+            if tasks is _STOP:
+                return
+            if self.budget and not self.budget.try_spend(sum(task.tokens for task in tasks)):
+                for task in tasks:
+                    self.skip(task)
+                    for follower in self.dedup.resolve(task, None) if self.dedup else []:
+                        self.skip(follower)
+                continue
+            with self.lock:
+                self.llm_requests += 1
+                self.chunks_analyzed += len(tasks)
+            failed = False
+            try:
+                per_task = self.analyze(tasks)
+            except Exception as e:
+                for task in tasks:
+                    self.report_error(task.js_url, e)
+                per_task = [task.local_findings for task in tasks]
+                failed = True
+            for task, findings in zip(tasks, per_task):
+                self.record(task, findings)
+                if self.dedup:
+                    resolved = None if failed else findings
+                    self.share_findings(task, resolved, self.dedup.resolve(task, resolved))
+
+    def share_findings(self, leader, findings, followers):
+        for task in followers:
+            shared = None
+            if findings is not None:
+                shared = self.share(leader, findings, task) if self.share else findings
+            if shared is None:
+                if self.budget and not self.budget.try_spend(task.tokens):
+                    self.skip(task)
+                    continue
+                shared = self.analyze_alone(task)
+            self.record(task, shared)
+
+    def analyze_alone(self, task):
+        with self.lock:
+            self.llm_requests += 1
+            self.chunks_analyzed += 1
+        try:
+            return self.analyze([task])[0]
+        except Exception as e:
+            self.report_error(task.js_url, e)
+            return task.local_findings
+
+    def skip(self, task):
+        with self.lock:
+            self.chunks_skipped += 1
+            self.partial_files.add(task.js_url)
+        self.record(task, task.local_findings)
+
+    def record(self, task, findings):
+        with self.lock:
+            self.results.extend(findings)
+            self.file_results[task.js_url].extend(findings)
+        if self.on_chunk_done:
+            self.on_chunk_done(task, findings)
+        self.settle(task.js_url)
+
+    def finish_file(self, js_url):
+        with self.lock:
+            self.pending_chunks.pop(js_url, None)
+            findings = self.file_results.pop(js_url, [])
+            content_hash = self.file_hashes.get(js_url)
+        if self.on_file_done:
+            self.on_file_done(js_url, findings, content_hash)
+
+    def report_error(self, js_url, error):
+        print(f"❌ Failed to fetch or scan {js_url}: {error}")
+        if self.on_error:
+            self.on_error(js_url, error)
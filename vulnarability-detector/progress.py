@@ -0,0 +1,86 @@
+import json
+import threading
+import time
+
+PROGRESS_INTERVAL = 0.5
+PARTIAL_BATCH_SIZE = 50
+
+
+class ProgressAggregator:
+    # Collects progress counters and findings from the pipeline's worker
+    # threads and emits them as at most one scan_update snapshot and one
+    # scan_partial batch per interval, however many chunks the scan has.
+
+    def __init__(self, emit, sid, interval=PROGRESS_INTERVAL):
+        self.emit = emit
+        self.sid = sid
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.counters = {
+            "files_found": 0,
+            "files_done": 0,
+            "files_failed": 0,
+            "chunks_total": 0,
+            "chunks_done": 0,
+            "bytes_processed": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "llm_skipped": 0,
+            "deduplicated": 0,
+        }
+        self.dirty = False
+        self.seen_findings = set()
+        self.pending_findings = []
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def update(self, **deltas):
+        with self.lock:
+            for name, delta in deltas.items():
+                self.counters[name] += delta
+            self.dirty = True
+
+    def totals(self):
+        with self.lock:
+            return dict(self.counters)
+
+    def add_findings(self, findings):
+        with self.lock:
+            for entry in findings:
+                key = (entry.get("vulnerability_type"), json.dumps(entry.get("leaked_value"), sort_keys=True))
+                if key not in self.seen_findings:
+                    self.seen_findings.add(key)
+                    self.pending_findings.append(entry)
+
+    def snapshot(self):
+        counters = dict(self.counters)
+        elapsed = time.monotonic() - self.started
+        done, total = counters["chunks_done"], counters["chunks_total"]
+        counters["elapsed_seconds"] = round(elapsed, 1)
+        counters["eta_seconds"] = round(elapsed / done * (total - done), 1) if done else None
+        counters["message"] = (
+            f"📊 {counters['files_done']}/{counters['files_found']} files, "
+            f"{done}/{total} chunks analyzed"
+        )
+        return counters
+
+    def flush(self):
+        with self.lock:
+            snapshot = self.snapshot() if self.dirty else None
+            self.dirty = False
+            findings, self.pending_findings = self.pending_findings, []
+        if snapshot:
+            self.emit("scan_update", snapshot, to=self.sid)
+        for i in range(0, len(findings), PARTIAL_BATCH_SIZE):
+            self.emit("scan_partial", {"findings": findings[i:i + PARTIAL_BATCH_SIZE]}, to=self.sid)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.flush()
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+        self.flush()
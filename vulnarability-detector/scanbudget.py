@@ -0,0 +1,49 @@
+import threading
+import time
+
+CRAWL_SHARE = 0.5
+
+
+class ScanBudget:
+    # Limits for a quick scan: wall-clock seconds since the scan started
+    # and/or estimated LLM input tokens. The crawl gets CRAWL_SHARE of the
+    # time; LLM requests are admitted through try_spend() until either limit
+    # is reached, and everything after that is skipped and counted.
+
+    def __init__(self, seconds=None, tokens=None):
+        self.seconds = seconds
+        self.tokens = tokens
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self.tokens_spent = 0
+        self.requests = 0
+
+    def crawl_deadline(self):
+        return self.started + self.seconds * CRAWL_SHARE if self.seconds else None
+
+    def exhausted(self):
+        if self.seconds and time.monotonic() - self.started >= self.seconds:
+            return True
+        return bool(self.tokens) and self.tokens_spent >= self.tokens
+
+    def try_spend(self, tokens):
+        # A request must fit in what is left of the token budget; only the
+        # first one may overshoot, so a budget smaller than one packed
+        # request still analyzes something.
+        with self.lock:
+            if self.exhausted():
+                return False
+            if self.tokens and self.requests and self.tokens_spent + tokens > self.tokens:
+                return False
+            self.tokens_spent += tokens
+            self.requests += 1
+            return True
+
+    def report(self):
+        return {
+            "budget_seconds": self.seconds,
+            "budget_tokens": self.tokens,
+            "elapsed_seconds": round(time.monotonic() - self.started, 3),
+            "tokens_spent": self.tokens_spent,
+            "llm_requests": self.requests,
+        }
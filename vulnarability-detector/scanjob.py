@@ -0,0 +1,369 @@
+import time
+from config import supabase_url, supabase_key, GEMINI_KEYS, FETCH_WORKERS, LLM_WORKERS, LLM_MAX_CONCURRENCY, CRAWL_POLITENESS_DELAY
+from jscrawler import JSFileCrawler
+from summarize import summarize_vulnerabilities
+from scanner import (
+    fetch_js_with_fallback,
+    iter_relevant_code,
+    split_js_code,
+    signal_score,
+    create_prompt,
+    create_packed_prompt,
+    assign_packed_findings,
+    estimate_tokens,
+    CHUNK_TOKEN_BUDGET,
+    extract_json_from_response,
+    with_file_url,
+    PROMPT_VERSION,
+)
+from detector import detect_secrets, needs_llm, merge_findings
+from findingscache import FindingsCache
+from httpcache import HTTPCache
+from llmscheduler import GeminiScheduler
+from pipeline import ScanPipeline
+from jsbody import content_hash, release
+from chunkdedup import ChunkDeduplicator, literals_covered
+from scanbudget import ScanBudget
+from checkpoints import ScanCheckpoints
+from persistence import SupabaseStore
+from progress import ProgressAggregator
+from metrics import metrics, StageTimings
+
+# Per-process scan services. init_services() is called once by the web
+# process (in-process mode) or by each scan worker process.
+emit_event = None
+findings_cache = None
+http_cache = None
+gemini_scheduler = None
+checkpoints = None
+crawl_politeness = None
+
+
+def init_services(emit, key_buckets=None, llm_concurrency=None, politeness=None):
+    global emit_event, findings_cache, http_cache, gemini_scheduler, checkpoints, crawl_politeness
+    emit_event = emit
+    findings_cache = FindingsCache(prompt_version=PROMPT_VERSION)
+    http_cache = HTTPCache()
+    gemini_scheduler = GeminiScheduler(
+        GEMINI_KEYS, max_concurrency=LLM_MAX_CONCURRENCY, buckets=key_buckets, concurrency=llm_concurrency
+    )
+    checkpoints = ScanCheckpoints(SupabaseStore(supabase_url, supabase_key))
+    crawl_politeness = politeness
+
+
+def resume_scan(base_url, user_id, scan_id, sid, budget=None):
+    scan = checkpoints.get_scan(scan_id)
+    if not scan or scan["user_id"] != user_id or scan["website_link"] != base_url or scan["scan_complete"]:
+        emit_event("scan_update", {"message": f"❌ Scan {scan_id} cannot be resumed."}, to=sid)
+        return
+    previous = checkpoints.load(scan_id)
+    emit_event(
+        "scan_update",
+        {"message": f"⏯️ Resuming scan {scan_id} with {len(previous)} file(s) already analyzed"},
+        to=sid
+    )
+    scan_and_process_files(base_url, scan_id, sid, previous=previous, resumed=True, budget=budget)
+
+
+def process_scan_and_summarize(
+    base_url, user_id, sid, resume_scan_id=None, incremental=True, budget=None, on_scan_created=None
+):
+    try:
+        if resume_scan_id:
+            resume_scan(base_url, user_id, resume_scan_id, sid, budget)
+            return
+
+        previous, previous_summary = {}, None
+        if incremental:
+            try:
+                last_scan = checkpoints.latest_completed_scan(base_url, user_id)
+                if last_scan:
+                    previous = checkpoints.load(last_scan["id"])
+                    previous_summary = last_scan.get("vulnerabilities")
+            except Exception as e:
+                print("Could not load previous scan:", e)
+
+        print("Inserting scan record:", base_url, user_id)
+        try:
+            scan_id = checkpoints.create_scan(base_url, user_id)
+        except Exception as e:
+            emit_event("scan_update", {"message": f"❌ Supabase insert failed: {e}"}, to=sid)
+            return
+        if on_scan_created:
+            on_scan_created(scan_id)
+
+        scan_and_process_files(
+            base_url, scan_id, sid, previous=previous, previous_summary=previous_summary, budget=budget
+        )
+
+    except Exception as e:
+        print("DB Insert or Summary Error:", e)
+        emit_event("scan_update", {"message": f"❌ Error in DB or summarization: {e}"}, to=sid)
+
+
+def prepare_chunks(js_code):
+    return split_js_code(iter_relevant_code(js_code))
+
+
+def scan_and_process_files(base_url, scan_id, sid, previous=None, previous_summary=None, resumed=False, budget=None):
+    print("🔥 scan_and_process_files started for", base_url)
+    scan_budget = ScanBudget(budget.get("seconds"), budget.get("tokens")) if budget else None
+    timings = StageTimings()
+    scan_started = time.monotonic()
+    previous = previous or {}
+    emit_event("scan_update", {"message": f"🗂️ Scan {scan_id} in progress", "scan_id": scan_id}, to=sid)
+    progress = ProgressAggregator(emit_event, sid)
+
+    def fetch(js_url):
+        if js_url in crawler.inline_scripts:
+            return crawler.inline_scripts[js_url]
+        with metrics.span("guardex_stage_seconds", timings, stage="fetch"):
+            js_code = fetch_js_with_fallback(js_url, cache=http_cache)
+        metrics.inc("guardex_bytes_total", len(js_code), kind="fetched")
+        progress.update(bytes_processed=len(js_code))
+        return js_code
+
+    def prepare(js_code):
+        # Chunks are handed on as they are produced; only the time spent
+        # producing them counts as filter time.
+        chunks = prepare_chunks(js_code)
+        elapsed = 0.0
+        while True:
+            started = time.monotonic()
+            chunk = next(chunks, None)
+            ended = time.monotonic()
+            elapsed += ended - started
+            timings.add("filter", started, ended)
+            if chunk is None:
+                break
+            metrics.inc("guardex_bytes_total", len(chunk), kind="filtered")
+            yield chunk
+        metrics.observe("guardex_stage_seconds", elapsed, stage="filter")
+
+    def analyze(tasks):
+        with metrics.span("guardex_stage_seconds", timings, stage="llm"):
+            return process_chunks(tasks)
+
+    def submit(js_url):
+        progress.update(files_found=1)
+        pipeline.submit(js_url)
+
+    def reuse_file(js_url, content_hash):
+        entry = previous.get(js_url)
+        if entry and entry["content_hash"] == content_hash:
+            progress.add_findings(entry["findings"])
+            return entry["findings"]
+        return None
+
+    def on_chunk_done(task, findings):
+        progress.update(chunks_done=1)
+        progress.add_findings(findings)
+
+    def on_file_done(js_url, findings, content_hash):
+        progress.update(files_done=1)
+        if js_url in pipeline.partial_files:
+            # Not fully analyzed under the budget; a later scan redoes it.
+            return
+        entry = previous.get(js_url)
+        if resumed and entry and entry["content_hash"] == content_hash:
+            return
+        checkpoints.save(scan_id, js_url, content_hash, findings)
+
+    def on_chunk_start(task):
+        progress.update(chunks_total=1)
+
+    def on_error(js_url, error):
+        progress.update(files_failed=1)
+
+    pipeline = ScanPipeline(
+        fetch=fetch,
+        prepare=prepare,
+        analyze=analyze,
+        triage=lambda task: triage_chunk(task, progress),
+        dedup=ChunkDeduplicator(),
+        share=lambda leader, findings, task: share_chunk_findings(leader, findings, task, progress),
+        budget=scan_budget,
+        reuse=reuse_file,
+        measure=estimate_tokens,
+        pack_budget=CHUNK_TOKEN_BUDGET,
+        fetch_workers=FETCH_WORKERS,
+        llm_workers=LLM_WORKERS,
+        fingerprint=content_hash,
+        release=release,
+        on_chunk_start=on_chunk_start,
+        on_file_done=on_file_done,
+        on_chunk_done=on_chunk_done,
+        on_error=on_error,
+    )
+
+    try:
+        try:
+            crawler = JSFileCrawler(
+                base_url,
+                max_depth=4,
+                politeness_delay=CRAWL_POLITENESS_DELAY,
+                on_js_found=submit,
+                http_cache=http_cache,
+                politeness=crawl_politeness,
+                deadline=scan_budget.crawl_deadline() if scan_budget else None,
+            )
+            with metrics.span("guardex_stage_seconds", timings, stage="crawl"):
+                js_files = crawler.crawl()
+            emit_event("scan_update", {"message": f"🔎 Finding files, found: {len(js_files)} files"}, to=sid)
+        except Exception as e:
+            emit_event("scan_update", {"message": f"❌ Error during crawl: {e}"}, to=sid)
+        finally:
+            pipeline.close()
+
+        final_results = pipeline.join()
+        progress.close()
+        print(f"📦 {pipeline.llm_requests} LLM request(s) for {pipeline.files_started} file(s)")
+        if pipeline.files_reused:
+            emit_event(
+                "scan_update",
+                {"message": f"♻️ {pipeline.files_reused} unchanged file(s) carried over from the previous scan"},
+                to=sid
+            )
+
+        totals = progress.totals()
+        emit_event(
+            "scan_update",
+            {
+                "message": (
+                    f"♻️ Findings cache: {totals['cache_hits']} hit(s), {totals['cache_misses']} miss(es); "
+                    f"{totals['llm_skipped']} chunk(s) cleared locally, "
+                    f"{totals['deduplicated']} duplicate chunk(s) shared"
+                ),
+                "cache_hits": totals["cache_hits"],
+                "cache_misses": totals["cache_misses"],
+                "llm_skipped": totals["llm_skipped"],
+                "deduplicated": totals["deduplicated"],
+            },
+            to=sid
+        )
+        if scan_budget:
+            report_coverage(pipeline, crawler, scan_budget, sid)
+        emit_event("scan_update", {"message": "JS scanning complete. Now summarizing..."}, to=sid)
+
+        unchanged = (
+            previous_summary is not None
+            and pipeline.files_reused == pipeline.files_started
+            and set(pipeline.file_hashes) == set(previous)
+        )
+        with metrics.span("guardex_stage_seconds", timings, stage="summarize"):
+            summarized_result = previous_summary if unchanged else summarize_vulnerabilities(final_results)
+
+        scan_ended = time.monotonic()
+        timings.add("total", scan_started, scan_ended)
+        metrics.observe("guardex_scan_seconds", scan_ended - scan_started)
+        stage_timings = timings.report()
+        emit_event(
+            "scan_update",
+            {
+                "message": "⏱️ " + ", ".join(
+                    f"{stage} {seconds['wall']:.1f}s"
+                    + (f" ({seconds['busy']:.1f}s summed)" if seconds["busy"] > seconds["wall"] + 0.05 else "")
+                    for stage, seconds in stage_timings.items()
+                ),
+                "timings": stage_timings,
+            },
+            to=sid
+        )
+        checkpoints.save_timings(scan_id, stage_timings)
+
+        emit_event("scan_update", {"message": "Summarizing complete!"}, to=sid)
+        emit_event("scan_complete", summarized_result, to=sid)
+
+        checkpoints.complete_scan(scan_id, summarized_result)
+
+    except Exception as e:
+        print(f"Error in processing files: {e}")
+        progress.close()
+        emit_event("scan_update", {"message": f"Error in processing: {e}"}, to=sid)
+
+
+def triage_chunk(task, progress):
+    # Counts go through the progress aggregator's lock: triage runs on every
+    # fetch worker thread at once.
+    local_findings = detect_secrets(task.code)
+    if not needs_llm(task.code, local_findings):
+        progress.update(llm_skipped=1)
+        metrics.inc("guardex_chunks_total", route="local")
+        return with_file_url(local_findings, task.js_url)
+
+    cached = findings_cache.get(task.code)
+    progress.update(**{"cache_hits" if cached is not None else "cache_misses": 1})
+    if cached is not None:
+        metrics.inc("guardex_chunks_total", route="cache")
+        return with_file_url(merge_findings(cached, local_findings), task.js_url)
+
+    task.local_findings = with_file_url(local_findings, task.js_url)
+    task.score = signal_score(task.code, local_findings)
+    return None
+
+
+def report_coverage(pipeline, crawler, scan_budget, sid):
+    chunks_total = pipeline.chunks_analyzed + pipeline.chunks_skipped
+    coverage = {
+        **scan_budget.report(),
+        "chunks_analyzed": pipeline.chunks_analyzed,
+        "chunks_skipped": pipeline.chunks_skipped,
+        "chunk_coverage": round(pipeline.chunks_analyzed / chunks_total, 3) if chunks_total else 1.0,
+        "files_complete": pipeline.files_started - len(pipeline.partial_files),
+        "files_partial": len(pipeline.partial_files),
+        "files_skipped": pipeline.files_skipped,
+        "crawl_stopped_early": crawler.stopped_early,
+    }
+    metrics.inc("guardex_chunks_total", pipeline.chunks_skipped, route="budget_skipped")
+    emit_event(
+        "scan_update",
+        {
+            "message": (
+                f"⏱️ Quick scan: {coverage['chunk_coverage']:.0%} of LLM-bound chunks analyzed, "
+                f"{coverage['files_partial']} file(s) partially and {coverage['files_skipped']} not covered"
+            ),
+            "coverage": coverage,
+        },
+        to=sid
+    )
+
+
+def share_chunk_findings(leader, findings, task, progress):
+    # A near copy can differ in exactly the value that matters, so it only
+    # inherits the leader's findings if its literals and URLs are all in
+    # the leader (the LLM saw every value it holds) and every leaked value
+    # is present in it; otherwise it gets its own LLM call. Its own local
+    # findings are kept.
+    if task.code != leader.code and (
+        not literals_covered(task.code, leader.code)
+        or any(str(entry.get("leaked_value") or "") not in task.code for entry in findings if isinstance(entry, dict))
+    ):
+        return None
+    progress.update(deduplicated=1)
+    metrics.inc("guardex_chunks_total", route="duplicate")
+    shared = [dict(entry) for entry in findings if isinstance(entry, dict)]
+    return with_file_url(merge_findings(shared, task.local_findings), task.js_url)
+
+
+def process_chunks(tasks):
+    metrics.inc("guardex_chunks_total", len(tasks), route="llm")
+    metrics.inc("guardex_llm_requests_total", provider="gemini")
+    if len(tasks) == 1:
+        prompt = create_prompt(tasks[0].code)
+    else:
+        prompt = create_packed_prompt([(task.js_url, task.code) for task in tasks])
+
+    # A failed call raises: the pipeline records the local findings and
+    # has copies waiting on these chunks analyzed on their own.
+    result = gemini_scheduler.generate(prompt)
+    parsed = extract_json_from_response(result)
+    if len(tasks) == 1:
+        per_task = [[entry for entry in parsed if isinstance(entry, dict)]]
+    else:
+        per_task = assign_packed_findings(parsed, [(task.js_url, task.code) for task in tasks])
+
+    results = []
+    for task, findings in zip(tasks, per_task):
+        findings_cache.put(task.code, findings)
+        results.append(with_file_url(merge_findings(findings, task.local_findings), task.js_url))
+    return results
@@ -1,24 +1,120 @@
+import bisect
 import os
 import json
 import re
 import requests
-from google import generativeai as genai
+from detector import detect_secrets, needs_llm, merge_findings, LLM_HINT_PATTERN, DOM_SINK_HINTS
+from llmscheduler import GeminiScheduler
+from jsbody import JSBody, release
 
+# Bump whenever create_prompt changes so cached findings are not reused.
+PROMPT_VERSION = "1"
 
-def split_js_code(js_code, max_chars=82000):
-    chunks = []
-    current = ""
 
-    for word in js_code.split(" "):  # Split on spaces
-        if len(current) + len(word) + 1 > max_chars:
-            chunks.append(current.strip())
-            current = ""
-        current += word + " "
+CHARS_PER_TOKEN = 3.5
+MODEL_INPUT_TOKENS = 32000
+CHUNK_OVERLAP_TOKENS = 64
+CHUNK_BOUNDARIES = ("\n", ";", "}", ",")
 
-    if current.strip():
-        chunks.append(current.strip())
 
-    return chunks
+def estimate_tokens(text):
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+class LiteralSpans:
+    # Where the string, comment and regex literals of one chunk window lie,
+    # from a single forward pass over it. A literal still open at the limit
+    # is followed past it (up to one more window); one that does not close
+    # there either (a huge data string) covers the rest of the window.
+
+    def __init__(self, js_code, start, limit):
+        self.starts = []
+        self.ends = []
+        scan_end = min(len(js_code), limit + (limit - start))
+        for match in OPEN_LITERAL_PATTERN.finditer(js_code, start, scan_end):
+            if match.start() >= limit:
+                break
+            self.starts.append(match.start())
+            if match.end() - match.start() == 1:
+                self.ends.append(scan_end)
+                break
+            self.ends.append(match.end())
+
+    def inside(self, pos):
+        i = bisect.bisect_right(self.starts, pos) - 1
+        return i >= 0 and pos < self.ends[i]
+
+
+def find_chunk_cut(js_code, start, limit, literals):
+    # Prefer the latest statement break, then object/argument breaks; never
+    # settle for one in the first half of the window or inside a literal.
+    floor = start + (limit - start) // 2
+    for boundary in CHUNK_BOUNDARIES:
+        cut = js_code.rfind(boundary, floor, limit)
+        while cut != -1 and literals.inside(cut):
+            cut = js_code.rfind(boundary, floor, cut)
+        if cut != -1:
+            return cut + 1
+    return limit
+
+
+def find_overlap_start(js_code, start, cut, overlap_chars, literals):
+    # The overlap is kept even when no clean boundary exists (a hard cut
+    # through a long literal), so a value on the cut is whole in one chunk.
+    floor = max(start, cut - overlap_chars)
+    for boundary in CHUNK_BOUNDARIES[:2]:
+        pos = js_code.find(boundary, floor, cut - 1)
+        while pos != -1 and literals.inside(pos):
+            pos = js_code.find(boundary, pos + 1, cut - 1)
+        if pos != -1:
+            return pos + 1
+    return floor
+
+
+def cut_chunk(js_code, start, max_chars, overlap_chars):
+    # The chunk starting at start, and where the next one starts.
+    length = len(js_code)
+    limit = start + max_chars
+    if limit >= length:
+        return js_code[start:].strip(), length
+    literals = LiteralSpans(js_code, start, limit)
+    cut = find_chunk_cut(js_code, start, limit, literals)
+    next_start = find_overlap_start(js_code, start, cut, overlap_chars, literals) if overlap_chars else cut
+    return js_code[start:cut].strip(), next_start if next_start > start else cut
+
+
+def split_js_code(js_code, max_tokens=None, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    # js_code is a string or an iterable of pieces joined by newlines (the
+    # windows from iter_relevant_code). Pieces are buffered only until a
+    # chunk and the literal scan after it fit, so chunks come out while the
+    # filter is still running and the joined text never exists in full.
+    if max_tokens is None:
+        max_tokens = CHUNK_TOKEN_BUDGET
+    max_chars = max(1, int(max_tokens * CHARS_PER_TOKEN))
+    overlap_chars = int(overlap_tokens * CHARS_PER_TOKEN)
+    pieces = (js_code,) if isinstance(js_code, str) else js_code
+
+    buffered, size = [], 0
+    for piece in pieces:
+        buffered.append(piece)
+        size += len(piece) + 1
+        if size <= 3 * max_chars:
+            continue
+        text = "\n".join(buffered)
+        start = 0
+        while len(text) - start > 2 * max_chars:
+            chunk, start = cut_chunk(text, start, max_chars, overlap_chars)
+            if chunk:
+                yield chunk
+        buffered = [text[start:]]
+        size = len(buffered[0])
+
+    text = "\n".join(buffered)
+    start = 0
+    while start < len(text):
+        chunk, start = cut_chunk(text, start, max_chars, overlap_chars)
+        if chunk:
+            yield chunk
 
 
 def create_prompt(chunk):
@@ -78,29 +174,48 @@ def create_prompt(chunk):
     """
 
 
-class GeminiPool:
-    def __init__(self, keys, rotation_limit=3):
-        self.keys = keys
-        self.rotation_limit = rotation_limit
-        self.current_index = 0
-        self.counter = 0
-        self.model = None
-        self.configure_model()
+CHUNK_TOKEN_BUDGET = MODEL_INPUT_TOKENS - estimate_tokens(create_prompt(""))
+
+PACKED_FILE_MARKER = "/* ===== FILE {index}: {url} ===== */"
+PACKED_FILE_PATTERN = re.compile(r"FILE\s*#?(\d+)")
+PACKED_INSTRUCTIONS = """The code below contains snippets from several JavaScript files. Each snippet starts
+        with a marker line like `/* ===== FILE 1: https://example.com/app.js ===== */`.
+        Set `file_url` of every vulnerability to the exact URL from the marker of the snippet it was found in.
+"""
 
-    def configure_model(self):
-        genai.configure(api_key=self.keys[self.current_index])
-        self.model = genai.GenerativeModel("gemini-1.5-flash")
 
-    def rotate_key(self):
-        self.counter = 0
-        self.current_index = (self.current_index + 1) % len(self.keys)
-        self.configure_model()
+def pack_snippets(parts):
+    return "\n".join(
+        f"{PACKED_FILE_MARKER.format(index=i + 1, url=js_url)}\n{code}"
+        for i, (js_url, code) in enumerate(parts)
+    )
 
-    def get_model(self):
-        if self.counter >= self.rotation_limit:
-            self.rotate_key()
-        self.counter += 1
-        return self.model
+
+def create_packed_prompt(parts):
+    return create_prompt(PACKED_INSTRUCTIONS + "\n" + pack_snippets(parts))
+
+
+def assign_packed_findings(findings, parts):
+    # Map each finding of a packed response back to the snippet it came from:
+    # by the file_url the model echoed, then by "FILE n", then by locating the
+    # leaked value in the snippets.
+    per_part = [[] for _ in parts]
+    for entry in findings:
+        if not isinstance(entry, dict):
+            continue
+        file_url = str(entry.get("file_url") or "")
+        candidates = [i for i, (js_url, _) in enumerate(parts) if js_url == file_url]
+        if not candidates:
+            match = PACKED_FILE_PATTERN.search(file_url)
+            if match and 0 < int(match.group(1)) <= len(parts):
+                candidates = [int(match.group(1)) - 1]
+        if len(candidates) != 1:
+            leaked = str(entry.get("leaked_value") or "")
+            pool = candidates or range(len(parts))
+            located = [i for i in pool if leaked and leaked in parts[i][1]]
+            candidates = located or list(pool)
+        per_part[candidates[0]].append(entry)
+    return per_part
 
 
 def extract_json_from_response(result_str):
@@ -120,54 +235,290 @@ def extract_json_from_response(result_str):
         return []
 
 
-def fetch_js_with_fallback(url, timeout=10):
+http_session = requests.Session()
+
+
+def fetch_js(url, timeout=10, cache=None):
+    # Returns (status, JSBody); callers release() the body when done.
+    if cache:
+        return cache.get(http_session, url, timeout=timeout)
+    with http_session.get(url, timeout=timeout, stream=True) as response:
+        if response.status_code != 200:
+            return response.status_code, None
+        return 200, JSBody.read(response)
+
+
+def fetch_js_with_fallback(url, timeout=10, cache=None):
     try:
-        response = requests.get(url, timeout=timeout)
-        if response.status_code == 200:
-            return response.text
+        status, body = fetch_js(url, timeout, cache)
+        if status == 200:
+            return body
     except:
         if url.startswith("http://"):
             try:
                 fallback_url = url.replace("http://", "https://", 1)
-                response = requests.get(fallback_url, timeout=timeout)
-                if response.status_code == 200:
-                    return response.text
+                status, body = fetch_js(fallback_url, timeout, cache)
+                if status == 200:
+                    return body
             except Exception as e:
                 print(f"❌ Fallback HTTPS also failed: {e}")
     raise Exception(f"❌ Could not fetch JS file: {url}")
 
 
+# Identifier suffixes that make the literal assigned or passed next to them
+# a signal however short it is: apiKey:"abc123", "X-Api-Key","…",
+# API_TOKEN = '…'. Matched case-insensitively against the few characters
+# before the opening quote.
+SIGNAL_NAMES = (
+    "key", "token", "secret", "passwd", "password", "pwd", "auth", "authorization",
+    "credential", "credentials", "bearer", "clientid", "client_id", "preset",
+)
+# (separator pattern, width) between the name and the opening quote.
+SIGNAL_NAME_SEPARATORS = ((r"[:=(,]", 1), (r"[\"'][:,]", 2), (r"[:=] ", 2), (r" = ", 3))
+COMMENT_OR_REGEX = (
+    r"/(?:\*[\s\S]*?\*/|/[^\n]*|(?<=[(,=:\[!&|?{};]/)(?![/*])(?:[^/\\\n\[]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[a-z]*)"
+)
+# A run of characters that can belong to a key, token or URL. Over UTF-8
+# bytes one character is a lead byte and its continuation bytes.
+VALUE_CHAR = r"[^\s\"'`\\]"
+UTF8_VALUE_CHAR = r"(?:[^\s\"'`\\\x80-\xbf][\x80-\xbf]*+)"
+URL_SCHEME_SEPARATOR = r"://(?:(?<=https://)|(?<=http://)|(?<=wss://)|(?<=ws://))"
+
+
+def string_literal(quote):
+    excluded = "`\\\\" if quote == "`" else rf"{quote}\\\n"
+    return rf"{quote}[^{excluded}]*(?:\\.[^{excluded}]*)*{quote}"
+
+
+def signal_name_lookbehind(quote):
+    # SIGNAL_NAMES plus separator right before the quote. Lookbehinds need a
+    # fixed width, so there is one per width, behind a cheap gate on the
+    # last three letters of the names that turns most literals away first.
+    letters = "".join(
+        "[" + "".join(sorted({c for name in SIGNAL_NAMES for c in (name[i], name[i].upper())})) + "]"
+        for i in (-3, -2, -1)
+    )
+    gate = "|".join(f"(?<={letters}{separator}{quote})" for separator, _ in SIGNAL_NAME_SEPARATORS)
+    named = {}
+    for name in SIGNAL_NAMES:
+        for separator, width in SIGNAL_NAME_SEPARATORS:
+            named.setdefault(len(name) + width, []).append(name + separator)
+    return f"(?:{gate})(?i:" + "|".join(
+        f"(?<=(?:{'|'.join(names)}){quote})" for _, names in sorted(named.items())
+    ) + ")"
+
+
+def signal_condition(quote, value_char):
+    # Checked right after the opening quote: the literal holds a URL, an API
+    # path or a 16+ character whitespace-free value such as a key, token or
+    # hostname, or it follows a SIGNAL_NAMES identifier. The scans are
+    # possessive, so each check reads a literal once.
+    excluded = "`\\\\" if quote == "`" else rf"{quote}\\\n"
+    return (
+        rf"(?=/[\w\-.]+/"
+        rf"|(?:[^{excluded}:]*+(?!{URL_SCHEME_SEPARATOR}):)*+[^{excluded}:]*+{URL_SCHEME_SEPARATOR}"
+        rf"|(?:{value_char}{{0,15}}+(?!{value_char})[^{excluded}])*+{value_char}{{16}})"
+        + "|" + signal_name_lookbehind(quote)
+    )
+
+
+def signal_literal(quote, value_char):
+    # The empty group matches only when signal_condition holds.
+    return rf"{quote}(?:(?:{signal_condition(quote, value_char)})()|)" + string_literal(quote)[1:]
+
+
+def sink_hint(hint):
+    # Matched from the hint's first capital or "(" (checked back to the
+    # start of the hint), so the engine still skips plain identifiers.
+    anchor = next(i for i, c in enumerate(hint) if c.isupper() or c == "(")
+    return re.escape(hint[anchor]) + f"(?<={re.escape(hint[:anchor + 1])})" + re.escape(hint[anchor + 1:])
+
+
+# String literals (escapes included), comments and regex literals: the
+# tokens that can hide quotes or chunk boundaries.
+LITERAL_PATTERN = re.compile("|".join(string_literal(quote) for quote in "\"'`") + "|" + COMMENT_OR_REGEX)
+# A bare quote is a literal that does not close.
+OPEN_LITERAL_PATTERN = re.compile(LITERAL_PATTERN.pattern + r"""|["'`]""")
+# Every LITERAL_PATTERN token is matched whole, left to right, so an
+# opening quote is never taken for a closing one whatever precedes it
+# (return"…", case"…", /["']/g). DOM sinks, storage and postMessage code
+# rarely holds a signal literal (el.innerHTML=e.data, eval(location.hash)),
+# so DOM_SINK_HINTS outside literals and comments are anchors too. Every
+# alternative starts with a fixed character, which lets the regex engine
+# skip the code between tokens; a token with a matched group is an anchor.
+# \s and \w are ASCII-only so text and byte scans agree.
+def signal_pattern(value_char=VALUE_CHAR):
+    return (
+        "|".join(signal_literal(quote, value_char) for quote in "\"'`") + "|" + COMMENT_OR_REGEX
+        + "".join(f"|{sink_hint(hint)}()" for hint in DOM_SINK_HINTS)
+    )
+
+
+SIGNAL_PATTERN = re.compile(signal_pattern(), re.ASCII)
+# Same matcher over raw bytes (or an mmap) for streamed bodies: as is for
+# single-byte encodings, counting characters instead of bytes for UTF-8.
+SIGNAL_PATTERN_BYTES = re.compile(signal_pattern().encode("ascii"))
+SIGNAL_PATTERN_UTF8 = re.compile(signal_pattern(UTF8_VALUE_CHAR).encode("ascii"))
+# (last boundary before a position, first boundary after it)
+STATEMENT_BOUNDARIES = (re.compile(r"[\s\S]*[;}\n]"), re.compile(r"[;}\n]"))
+STATEMENT_BOUNDARIES_BYTES = tuple(re.compile(pattern.pattern.encode("ascii")) for pattern in STATEMENT_BOUNDARIES)
+WINDOW_CONTEXT = 160
+WINDOW_MERGE_GAP = 32
+
+
+def iter_signals(js_code, pattern=SIGNAL_PATTERN):
+    for match in pattern.finditer(js_code):
+        if match.lastindex:
+            yield match.span()
+
+
+class CharOffsets:
+    # Moves positions in text, or in bytes of a single-byte encoding, by a
+    # number of characters.
+
+    def back(self, js_code, pos, count):
+        return max(0, pos - count)
+
+    def forward(self, js_code, pos, count):
+        return min(len(js_code), pos + count)
+
+    def within(self, js_code, start, end, count):
+        return end - start <= count
+
+
+class Utf8Offsets(CharOffsets):
+    # Same over UTF-8 bytes: positions stay on character boundaries, so a
+    # window never splits a sequence and matches the one cut from the
+    # decoded text. A character is at most 4 bytes; invalid bytes count as
+    # one character each.
+
+    def back(self, js_code, pos, count):
+        low = max(0, pos - 4 * count)
+        while low < pos and 0x80 <= js_code[low] < 0xc0:
+            low += 1
+        text = bytes(js_code[low:pos]).decode("utf-8", "surrogateescape")
+        return pos - len(text[max(0, len(text) - count):].encode("utf-8", "surrogateescape"))
+
+    def forward(self, js_code, pos, count):
+        text = bytes(js_code[pos:pos + 4 * count]).decode("utf-8", "surrogateescape")
+        return pos + len(text[:count].encode("utf-8", "surrogateescape"))
+
+    def within(self, js_code, start, end, count):
+        if end - start <= count or end - start > 4 * count:
+            return end - start <= count
+        return len(bytes(js_code[start:end]).decode("utf-8", "surrogateescape")) <= count
+
+
+CHAR_OFFSETS = CharOffsets()
+UTF8_OFFSETS = Utf8Offsets()
+
+
+def window_start(js_code, pos, boundaries=STATEMENT_BOUNDARIES, offsets=CHAR_OFFSETS):
+    floor = offsets.back(js_code, pos, WINDOW_CONTEXT)
+    match = boundaries[0].match(js_code, floor, pos)
+    return match.end() if match else floor
+
+
+def window_end(js_code, pos, boundaries=STATEMENT_BOUNDARIES, offsets=CHAR_OFFSETS):
+    ceiling = offsets.forward(js_code, pos, WINDOW_CONTEXT)
+    match = boundaries[1].search(js_code, pos, ceiling)
+    return match.end() if match else ceiling
+
+
+def iter_windows(js_code, signals, boundaries, offsets=CHAR_OFFSETS):
+    start = end = None
+    for hit_start, hit_end in signals:
+        if end is not None and offsets.within(js_code, end, hit_start, WINDOW_MERGE_GAP):
+            if hit_end > end:
+                end = window_end(js_code, hit_end, boundaries, offsets)
+            continue
+        if end is not None:
+            yield start, end
+        start = window_start(js_code, hit_start, boundaries, offsets)
+        end = window_end(js_code, hit_end, boundaries, offsets)
+
+    if end is not None:
+        yield start, end
+
+
+def iter_relevant_code(js_code):
+    # Single pass over the code with one combined matcher. Each hit is widened
+    # to the surrounding statement (capped at WINDOW_CONTEXT on either side),
+    # nearby windows are merged, and repeated windows are dropped. A UTF-8
+    # or single-byte JSBody is scanned in place and only its windows are
+    # decoded; the windows are the same as for its decoded text.
+    if isinstance(js_code, JSBody) and (js_code.utf8 or js_code.single_byte):
+        view = js_code.view()
+        if js_code.utf8:
+            signals, offsets = iter_signals(view, SIGNAL_PATTERN_UTF8), UTF8_OFFSETS
+        else:
+            signals, offsets = iter_signals(view, SIGNAL_PATTERN_BYTES), CHAR_OFFSETS
+        spans = iter_windows(view, signals, STATEMENT_BOUNDARIES_BYTES, offsets)
+        windows = (js_code.decode(view[start:end]) for start, end in spans)
+    else:
+        if isinstance(js_code, JSBody):
+            js_code = js_code.text()
+        spans = iter_windows(js_code, iter_signals(js_code), STATEMENT_BOUNDARIES)
+        windows = (js_code[start:end] for start, end in spans)
+
+    seen = set()
+    for window in windows:
+        window = window.strip()
+        if window and window not in seen:
+            seen.add(window)
+            yield window
+
+
+CONFIG_KEY_PATTERN = re.compile(
+    r"\b(?:apiKey|api_key|authDomain|projectId|storageBucket|clientId|client_id|secretKey|accessKey"
+    r"|baseURL|baseUrl|endpoint|dsn)[\"']?\s*:"
+)
+
+
+def signal_score(code, local_findings):
+    # Signal density per KB, used to order LLM requests: local detections
+    # weigh most, then config-object keys, hint words and quoted
+    # URLs/key-like literals.
+    hits = (
+        10 * len(local_findings)
+        + 4 * len(CONFIG_KEY_PATTERN.findall(code))
+        + 2 * len(LLM_HINT_PATTERN.findall(code))
+        + sum(1 for _ in iter_signals(code))
+    )
+    return hits * 1024 / (len(code) + 1024)
+
+
 def more_aggressive_filter(js_code):
-    patterns = [
-        r"[\"'][^\"']+[\"']",
-        r"\b(apiKey|secret|token|auth|key|id)\b",
-        r"[a-zA-Z0-9]{10,}",
-        r"(http:\/\/|https:\/\/|ws:\/\/|wss:\/\/)[^\"']+",
-        r"dpl_[a-zA-Z0-9]+",
-    ]
-    relevant_code = ""
-    seen_lines = set()
-    for line in js_code.splitlines():
-        for pattern in patterns:
-            if re.search(pattern, line):
-                if line not in seen_lines:
-                    relevant_code += line + "\n"
-                    seen_lines.add(line)
-                break
-    return relevant_code.strip()
+    return "\n".join(iter_relevant_code(js_code))
+
 
+def with_file_url(findings, js_url):
+    for entry in findings:
+        entry["file_url"] = js_url
+    return findings
 
-def scan_all_js(js_urls, gemini_keys):
-    pool = GeminiPool(gemini_keys)
+
+def scan_all_js(js_urls, gemini_keys, cache=None, http_cache=None, scheduler=None, inline_scripts=None):
+    # inline_scripts maps the crawler's page#inline-<hash> pseudo-URLs to
+    # their bodies; those are scanned as is instead of refetching the page.
+    scheduler = scheduler or GeminiScheduler(gemini_keys)
+    inline_scripts = inline_scripts or {}
     final_results = []
+    cache_stats = {"hits": 0, "misses": 0}
 
     unique_urls = list(set(js_urls))
 
     for js_url in unique_urls:
         try:
-            js_code = fetch_js_with_fallback(js_url)
-            filtered_code = more_aggressive_filter(js_code)
-            chunks = split_js_code(filtered_code)  # Split the filtered code
+            if js_url in inline_scripts:
+                js_code = inline_scripts[js_url]
+            else:
+                js_code = fetch_js_with_fallback(js_url, cache=http_cache)
+            try:
+                filtered_code = more_aggressive_filter(js_code)
+            finally:
+                release(js_code)
+            chunks = list(split_js_code(filtered_code))  # Split the filtered code
 
             total_chunks = len(chunks)
             print(f"\n📁 Scanning {js_url} — {total_chunks} chunk(s) (Filtered)")
@@ -176,23 +527,32 @@ def scan_all_js(js_urls, gemini_keys):
                 percent_complete = int((i + 1) / total_chunks * 100)
                 print(f"🔍 Scanning chunk {i + 1}/{total_chunks} ({percent_complete}%)")
 
-                retries = 0
-                while retries < len(gemini_keys):
-                    try:
-                        model = pool.get_model()
-                        result = model.generate_content(create_prompt(chunk)).text
-                        parsed = extract_json_from_response(result)
-                        for entry in parsed:
-                            entry["file_url"] = js_url
-                        final_results.extend(parsed)
-                        break
-                    except Exception as e:
-                        print(f"⚠️ Gemini call failed: {e}")
-                        pool.rotate_key()
-                        retries += 1
+                local_findings = detect_secrets(chunk)
+                if not needs_llm(chunk, local_findings):
+                    final_results.extend(with_file_url(local_findings, js_url))
+                    continue
+
+                cached = cache.get(chunk, cache_stats) if cache else None
+                if cached is not None:
+                    final_results.extend(with_file_url(merge_findings(cached, local_findings), js_url))
+                    continue
+
+                try:
+                    result = scheduler.generate(create_prompt(chunk))
+                except Exception as e:
+                    print(f"⚠️ Gemini call failed: {e}")
+                    final_results.extend(with_file_url(local_findings, js_url))
+                    continue
+
+                parsed = extract_json_from_response(result)
+                if cache:
+                    cache.put(chunk, parsed)
+                final_results.extend(with_file_url(merge_findings(parsed, local_findings), js_url))
 
         except Exception as e:
             print(f"❌ Failed to fetch or scan {js_url}: {e}")
             continue
 
+    if cache:
+        print(f"♻️ Findings cache: {cache_stats['hits']} hit(s), {cache_stats['misses']} miss(es)")
     return final_results
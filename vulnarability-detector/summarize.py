@@ -1,11 +1,127 @@
 import json
 import re
-from google import generativeai as genai
+from concurrent.futures import ThreadPoolExecutor
+from llmscheduler import GeminiScheduler
 
 GEMINI_KEY = ""
+SUMMARY_MODEL = "gemini-2.0-flash"
 BATCH_SIZE = 20
+SUMMARY_WORKERS = 4
+PROMPT_FIELDS = ("vulnerability_type", "name", "description", "leaked_value", "recommendation", "severity")
+SEVERITY_RANK = {"low": 0, "medium": 1, "high": 2, "critical": 3}
+VENDORS = (
+    "firebase", "openai", "stripe", "cloudinary", "github", "vercel", "supabase", "aws",
+    "google", "slack", "sendgrid", "twilio", "mapbox", "sentry", "algolia", "jwt", "websocket",
+)
 
-def summarize_vulnerabilities(report_data):
+summary_scheduler = None
+
+
+def get_summary_scheduler():
+    global summary_scheduler
+    if summary_scheduler is None:
+        summary_scheduler = GeminiScheduler([GEMINI_KEY] if GEMINI_KEY else [], model_name=SUMMARY_MODEL)
+    return summary_scheduler
+
+
+def detect_vendor(entry):
+    text = " ".join(str(entry.get(field) or "") for field in ("vulnerability_type", "name", "leaked_value")).lower()
+    return next((vendor for vendor in VENDORS if vendor in text), "custom")
+
+
+def normalize_value(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(sorted(normalize_value(v) for v in value))
+    if isinstance(value, dict):
+        return json.dumps(value, sort_keys=True)
+    return " ".join(str(value or "").split()).strip("\"'`")
+
+
+def as_value_list(value):
+    if value is None:
+        return []
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def higher_severity(a, b):
+    return a if SEVERITY_RANK.get(str(a).lower(), -1) >= SEVERITY_RANK.get(str(b).lower(), -1) else b
+
+
+def normalize_name(entry):
+    return " ".join(str(entry.get("name") or "").lower().split())
+
+
+def add_file_urls(target, file_urls):
+    for file_url in as_value_list(file_urls):
+        if file_url and file_url != "N/A" and file_url not in target["file_url"]:
+            target["file_url"].append(file_url)
+
+
+def dedupe_findings(report_data):
+    # Collapse the same leak reported from many chunks/files into one entry
+    # before anything is sent to the LLM. Findings without a leaked value
+    # (XSS sinks, insecure storage) are only the same when their names
+    # match. file_url lists every file the finding was seen in.
+    groups = {}
+    for entry in report_data:
+        if not isinstance(entry, dict):
+            continue
+        value = normalize_value(entry.get("leaked_value"))
+        key = (
+            detect_vendor(entry),
+            str(entry.get("vulnerability_type") or "").strip().lower(),
+            value,
+            "" if value else normalize_name(entry),
+        )
+        if key not in groups:
+            groups[key] = {field: entry[field] for field in PROMPT_FIELDS if entry.get(field) is not None}
+            groups[key]["file_url"] = []
+        else:
+            merged = groups[key]
+            merged["severity"] = higher_severity(merged.get("severity"), entry.get("severity"))
+        add_file_urls(groups[key], entry.get("file_url"))
+    return [groups[key] for key in sorted(groups, key=lambda k: (k[0], k[1]))]
+
+
+def merge_batch_results(results):
+    # Batches are vendor-sorted, so one vendor/type can still straddle two
+    # batches; fold those together and union their leaked values. Within a
+    # vendor/type only entries with the same name or a shared leaked value
+    # are the same finding, so unrelated "custom" findings stay apart.
+    merged = {}
+    for entry in results:
+        if not isinstance(entry, dict):
+            continue
+        key = (detect_vendor(entry), str(entry.get("vulnerability_type") or "").strip().lower())
+        values = {normalize_value(v) for v in as_value_list(entry.get("leaked_value"))}
+        bucket = merged.setdefault(key, [])
+        target = next(
+            (
+                candidate for candidate in bucket
+                if normalize_name(candidate) == normalize_name(entry)
+                or values & {normalize_value(v) for v in candidate["leaked_value"]}
+            ),
+            None,
+        )
+        if target is None:
+            bucket.append(dict(
+                entry, leaked_value=as_value_list(entry.get("leaked_value")), file_url=as_value_list(entry.get("file_url"))
+            ))
+            continue
+        seen = {normalize_value(v) for v in target["leaked_value"]}
+        for value in as_value_list(entry.get("leaked_value")):
+            if normalize_value(value) not in seen:
+                seen.add(normalize_value(value))
+                target["leaked_value"].append(value)
+        add_file_urls(target, entry.get("file_url"))
+        target["severity"] = higher_severity(target.get("severity"), entry.get("severity"))
+        for field in ("description", "recommendation"):
+            if len(str(entry.get(field) or "")) > len(str(target.get(field) or "")):
+                target[field] = entry[field]
+    return [entry for bucket in merged.values() for entry in bucket]
+
+
+def summarize_vulnerabilities(report_data, scheduler=None):
     def create_prompt(data):
         return f"""
         You are an expert security analyst.
@@ -17,6 +133,7 @@ def summarize_vulnerabilities(report_data):
         - leaked_value
         - recommendation
         - severity
+        - file_url (array of the files the finding was seen in)
 
         Your task:
 
@@ -34,6 +151,7 @@ def summarize_vulnerabilities(report_data):
           - For example: Firebase keys should stay together, OpenAI keys separately.
         - Keep `leaked_value` as an array of valid strings only.
         - DO NOT flatten or concatenate different leaked values into a single string.
+        - Keep `file_url` as an array holding every file of the merged findings.
         - Be specific. One vulnerability per vendor/tool per context.
         - Write the recommendation and description in detail to ensure it provides complete understanding.
 
@@ -49,7 +167,7 @@ def summarize_vulnerabilities(report_data):
         ###JSONEND
 
         Here is the data:
-        {json.dumps(data, indent=2)}
+        {json.dumps(data, separators=(",", ":"))}
         """
 
     def extract_cleaned_json(text):
@@ -64,25 +182,30 @@ def summarize_vulnerabilities(report_data):
         for i in range(0, len(data), size):
             yield data[i:i + size]
 
-    genai.configure(api_key=GEMINI_KEY)
-    model = genai.GenerativeModel("gemini-2.0-flash")
-
-    final_result = []
-    batches = list(batch_chunks(report_data, BATCH_SIZE))
-
-    for i, batch in enumerate(batches):
-        print(f"🧪 Processing batch {i + 1}/{len(batches)}")
-        prompt = create_prompt(batch)
+    def summarize_batch(index, batch, total):
+        print(f"🧪 Processing batch {index + 1}/{total}")
         try:
-            response = model.generate_content(prompt)
-            print("response ", response)
-            batch_result = extract_cleaned_json(response.text)
+            response_text = scheduler.generate(create_prompt(batch))
+            batch_result = extract_cleaned_json(response_text)
             print("batch_result ", batch_result)
-            if batch_result:
-                final_result.extend(batch_result)
+            return batch_result
         except Exception as e:
-            print(f"Error in batch {i + 1}: {e}")
-            continue
-    
+            print(f"Error in batch {index + 1}: {e}")
+            return []
+
+    scheduler = scheduler or get_summary_scheduler()
+    unique_findings = dedupe_findings(report_data)
+    print(f"🧹 {len(report_data)} finding(s) reduced to {len(unique_findings)} distinct issue(s)")
+
+    batches = list(batch_chunks(unique_findings, BATCH_SIZE))
+    with ThreadPoolExecutor(max_workers=SUMMARY_WORKERS) as executor:
+        batch_results = list(executor.map(
+            lambda item: summarize_batch(item[0], item[1], len(batches)), enumerate(batches)
+        ))
+
+    final_result = [entry for batch_result in batch_results for entry in batch_result]
+    if len(batches) > 1:
+        final_result = merge_batch_results(final_result)
+
     print("end...")
-    return final_result
\ No newline at end of file
+    return final_result
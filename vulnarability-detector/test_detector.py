@@ -0,0 +1,31 @@
+import base64
+import random
+
+from detector import detect_secrets
+
+
+def random_bytes(n, seed=7):
+    rng = random.Random(seed)
+    return bytes(rng.randrange(256) for _ in range(n))
+
+
+def test_data_uri_payloads_are_not_secrets():
+    png = base64.b64encode(random_bytes(600)).decode()
+    font = base64.b64encode(random_bytes(900, seed=8)).decode()
+    bundle = (
+        f'var logo="data:image/png;base64,{png}";'
+        f'@font-face{{src:url(data:font/woff2;base64,{font}) format("woff2")}}'
+        f'var inlined="{font}";'
+    )
+    assert detect_secrets(bundle) == []
+
+
+def test_secrets_next_to_data_uris_are_still_found():
+    png = base64.b64encode(random_bytes(300)).decode()
+    key = "sk_live_" + "a1B2c3D4e5F6g7H8i9J0k1L2"
+    token = "Zx8Qm2Rt7Wv4Ky9Bn3Lp6Hd1"
+    bundle = f'var logo="data:image/png;base64,{png}",stripeKey="{key}",sessionSecret="{token}";'
+    values = [finding["leaked_value"] for finding in detect_secrets(bundle)]
+    assert key in values
+    assert token in values
+    assert not any(png in value for value in values)
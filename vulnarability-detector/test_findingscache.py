@@ -0,0 +1,17 @@
+from findingscache import FindingsCache
+
+
+def stored_bytes(cache):
+    return cache.conn.execute("SELECT SUM(size) FROM findings").fetchone()[0]
+
+
+def test_limit_holds_for_caches_sharing_a_file(tmp_path):
+    # Two processes' caches on one file: each must see the other's writes.
+    path = str(tmp_path / "findings.sqlite3")
+    first = FindingsCache(path, max_bytes=2000)
+    second = FindingsCache(path, max_bytes=2000)
+    for i in range(40):
+        (first if i % 2 else second).put(f"chunk {i}", [{"name": "x" * 100}])
+    assert stored_bytes(first) <= 2000
+    assert first.get("chunk 39") is not None
+    assert first.get("chunk 0") is None
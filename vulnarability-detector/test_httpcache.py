@@ -0,0 +1,49 @@
+from httpcache import HTTPCache
+from metrics import metrics
+
+BODY = b"var endpoint='https://api.example.com/v1';"
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=b""):
+        self.status_code = status_code
+        self.body = body
+        self.headers = {"ETag": '"v1"'}
+        self.encoding = "utf-8"
+
+    def iter_content(self, size):
+        yield self.body
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FakeSession:
+    def get(self, url, headers=None, timeout=None, stream=False):
+        return FakeResponse(304) if headers else FakeResponse(200, BODY)
+
+
+def counter(name, **labels):
+    return metrics.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+
+def test_origin_and_cached_bytes_are_counted(tmp_path):
+    cache = HTTPCache(str(tmp_path))
+    origin = counter("guardex_http_cache_bytes_total", source="origin")
+    cached = counter("guardex_http_cache_bytes_total", source="cache")
+    revalidated = counter("guardex_http_cache_revalidated_total")
+
+    for _ in range(2):
+        status, body = cache.get(FakeSession(), "https://example.com/app.js")
+        assert status == 200 and bytes(body.view()) == BODY
+        body.close()
+
+    assert counter("guardex_http_cache_bytes_total", source="origin") - origin == len(BODY)
+    assert counter("guardex_http_cache_bytes_total", source="cache") - cached == len(BODY)
+    assert counter("guardex_http_cache_revalidated_total") - revalidated == 1
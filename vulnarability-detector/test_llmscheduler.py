@@ -0,0 +1,17 @@
+import threading
+
+from llmscheduler import ConcurrencyLimit
+
+
+def test_release_owner_frees_the_slots_of_a_dead_worker():
+    limit = ConcurrencyLimit(2)
+    limit.acquire(101)
+    limit.acquire(101)
+    acquired = threading.Event()
+    waiter = threading.Thread(target=lambda: (limit.acquire(202), acquired.set()), daemon=True)
+    waiter.start()
+    assert not acquired.wait(0.2)
+    limit.release_owner(101)
+    assert acquired.wait(2)
+    limit.release(202)
+    assert limit.holders == {}
@@ -0,0 +1,92 @@
+import json
+import threading
+
+import pytest
+
+import scanjob
+from chunkdedup import ChunkDeduplicator
+from pipeline import ChunkTask, ScanPipeline
+
+CODE = 'const api = fetch("https://api.example.com/v1/orders", {headers: {"X-Api-Key": key}});'
+FINDING = {"vulnerability_type": "Exposed endpoint", "name": "Orders API", "leaked_value": "https://api.example.com/v1/orders"}
+
+
+class FakeCache:
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, code):
+        return self.entries.get(code)
+
+    def put(self, code, findings):
+        self.entries[code] = findings
+
+
+class FailingFirstScheduler:
+    # The first call waits until release is set, then fails; later calls
+    # answer with FINDING.
+    def __init__(self, release):
+        self.release = release
+        self.calls = 0
+
+    def generate(self, prompt):
+        self.calls += 1
+        if self.calls == 1:
+            self.release.wait(5)
+            raise RuntimeError("upstream 500")
+        return json.dumps([FINDING])
+
+
+class ClaimCounter(ChunkDeduplicator):
+    def __init__(self, claimed):
+        super().__init__()
+        self.claimed = claimed
+        self.claims = 0
+
+    def claim(self, task):
+        result = super().claim(task)
+        self.claims += 1
+        if self.claims == 2:
+            self.claimed.set()
+        return result
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = FakeCache()
+    monkeypatch.setattr(scanjob, "findings_cache", cache)
+    return cache
+
+
+def test_failed_llm_call_raises(monkeypatch, cache):
+    release = threading.Event()
+    release.set()
+    monkeypatch.setattr(scanjob, "gemini_scheduler", FailingFirstScheduler(release))
+    with pytest.raises(RuntimeError):
+        scanjob.process_chunks([ChunkTask("https://example.com/a.js", 0, CODE)])
+    assert cache.entries == {}
+
+
+def test_copies_of_a_failed_leader_are_analyzed_again(monkeypatch, cache):
+    claimed = threading.Event()
+    scheduler = FailingFirstScheduler(claimed)
+    monkeypatch.setattr(scanjob, "gemini_scheduler", scheduler)
+    errors = []
+    pipeline = ScanPipeline(
+        fetch=lambda js_url: CODE,
+        prepare=lambda js_code: [js_code],
+        analyze=scanjob.process_chunks,
+        dedup=ClaimCounter(claimed),
+        fetch_workers=1,
+        llm_workers=1,
+        on_error=lambda js_url, error: errors.append(js_url),
+    )
+    pipeline.submit("https://example.com/a.js")
+    pipeline.submit("https://example.com/b.js")
+    pipeline.close()
+    results = pipeline.join()
+
+    assert errors == ["https://example.com/a.js"]
+    assert scheduler.calls == 2
+    assert [entry["file_url"] for entry in results] == ["https://example.com/b.js"]
+    assert results[0]["leaked_value"] == FINDING["leaked_value"]
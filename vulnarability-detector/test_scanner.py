@@ -0,0 +1,44 @@
+from jsbody import JSBody
+from scanner import iter_relevant_code
+
+
+def body_of(code, encoding):
+    body = JSBody(encoding)
+    body.write(code.encode(encoding))
+    return body.finish()
+
+
+def assert_same_windows(code, encoding="utf-8"):
+    body = body_of(code, encoding)
+    try:
+        assert list(iter_relevant_code(body)) == list(iter_relevant_code(code))
+    finally:
+        body.close()
+
+
+def test_short_non_ascii_literal_is_not_a_value_run():
+    # 10 characters but 20 bytes in UTF-8.
+    assert_same_windows('var a=1;var label="éééééééééé";var b=2;')
+
+
+def test_window_context_counts_characters():
+    prefix = "var 説明=" + "漢" * 300 + ","
+    suffix = "," + "字" * 300 + "\n"
+    assert_same_windows(prefix + 'url="https://api.example.com/v1/users"' + suffix)
+
+
+def test_window_edges_do_not_split_sequences():
+    for pad in range(4):
+        code = "x" * pad + "é😀" * 120 + 'fetch("https://api.example.com/ö")' + "😀é" * 120
+        assert_same_windows(code)
+
+
+def test_nearby_hits_merge_by_character_gap():
+    between = "ü" * 30
+    code = 'a="https://one.example.com/x";' + between + 'b="https://two.example.com/y"'
+    assert_same_windows(code)
+
+
+def test_single_byte_encodings_match_text():
+    code = 'var a="\xa0\xa0token\xa0value\xa0here\xa0\xa0";el.innerHTML=x;' + "\xe9" * 200 + 'k="https://e.example/\xfc"'
+    assert_same_windows(code, "latin-1")
@@ -0,0 +1,102 @@
+import re
+import threading
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+# Click and campaign IDs only; generic names such as ref or source can
+# select different page content.
+TRACKING_PARAMS = {
+    "gclid", "dclid", "fbclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid",
+    "_ga", "_gl", "ref_src", "spm", "trk",
+}
+TRACKING_PREFIXES = ("utm_", "pk_", "hsa_")
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+INDEX_PAGES = ("index.html", "index.htm", "index.php")
+
+ID_SEGMENT = re.compile(
+    r"^(?:\d+|[0-9a-f]{8,}|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})$", re.IGNORECASE
+)
+SLUG_SEGMENT = re.compile(r"^(?=.*[a-z])[a-z0-9]+(?:[-_][a-z0-9]+){2,}(?:\.html?)?$", re.IGNORECASE)
+NUMBERED_SEGMENT = re.compile(r"\d{3,}")
+
+
+def canonical_netloc(parts):
+    # Lower-case host, with the port only if it is not the scheme's default.
+    host = (parts.hostname or "").lower()
+    if parts.port and str(parts.port) != DEFAULT_PORTS.get(parts.scheme.lower()):
+        host = f"{host}:{parts.port}"
+    return host
+
+
+def canonicalize_url(url):
+    # One spelling per page: lower-case scheme/host, no default port,
+    # fragment, tracking parameters, index file or trailing slash, and
+    # query parameters in a stable order.
+    parts = urlparse(url)
+    scheme = parts.scheme.lower()
+    host = canonical_netloc(parts)
+
+    path = re.sub(r"/{2,}", "/", parts.path or "/")
+    for index_page in INDEX_PAGES:
+        if path.endswith("/" + index_page):
+            path = path[:-len(index_page)]
+    if len(path) > 1 and path.endswith("/"):
+        path = path.rstrip("/") or "/"
+
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    )
+    return urlunparse((scheme, host, path, "", urlencode(query), ""))
+
+
+def segment_pattern(segment):
+    if ID_SEGMENT.match(segment):
+        return "{id}"
+    if SLUG_SEGMENT.match(segment) or NUMBERED_SEGMENT.search(segment):
+        return "{slug}"
+    return segment
+
+
+def url_template(url):
+    # /product/123?color=red and /product/456?color=blue share a template:
+    # ids and slugs become placeholders and query values are dropped.
+    parts = urlparse(url)
+    segments = [segment_pattern(s) for s in parts.path.split("/") if s]
+    keys = sorted({key for key, _ in parse_qsl(parts.query, keep_blank_values=True)})
+    return "/" + "/".join(segments) + ("?" + "&".join(keys) if keys else "")
+
+
+class TemplateSampler:
+    # Caps how many pages per URL template get crawled. Besides the id/slug
+    # rules, a path prefix with more than max_children distinct child
+    # segments (e.g. /shop/<product-name>) is folded into a "{*}" template.
+
+    def __init__(self, max_pages_per_template=3, max_children=20):
+        self.max_pages_per_template = max_pages_per_template
+        self.max_children = max_children
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.children = {}
+        self.skipped = 0
+
+    def template_for(self, url):
+        template = url_template(url)
+        path, _, query = template.partition("?")
+        parent, _, child = path.rpartition("/")
+        if child and not child.startswith("{"):
+            seen = self.children.setdefault(parent, set())
+            if len(seen) < self.max_children:
+                seen.add(child)
+            elif child not in seen:
+                template = f"{parent}/{{*}}" + (f"?{query}" if query else "")
+        return template
+
+    def admit(self, url):
+        with self.lock:
+            template = self.template_for(url)
+            count = self.counts.get(template, 0)
+            if self.max_pages_per_template and count >= self.max_pages_per_template:
+                self.skipped += 1
+                return False
+            self.counts[template] = count + 1
+            return True
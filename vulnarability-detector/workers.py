@@ -0,0 +1,136 @@
+import multiprocessing
+import os
+import threading
+import time
+from multiprocessing.managers import BaseManager
+
+from config import GEMINI_KEYS, LLM_MAX_CONCURRENCY, MAX_RUNNING_PER_USER
+from jobqueue import JobQueue
+from jscrawler import HostPoliteness
+from llmscheduler import ConcurrencyLimit, KeyBuckets, parse_keys
+from metrics import metrics
+
+WORKER_POLL_INTERVAL = 0.5
+WORKER_MONITOR_INTERVAL = 2.0
+METRICS_PUSH_INTERVAL = 5.0
+METRICS_EVENT = "__metrics__"
+
+
+class SharedLimits(BaseManager):
+    # Serves one KeyBuckets, ConcurrencyLimit and HostPoliteness to every
+    # worker process, so Gemini quotas, the cap on concurrent Gemini calls and
+    # per-host crawl pacing hold across the whole pool.
+    pass
+
+
+SharedLimits.register("KeyBuckets", KeyBuckets)
+SharedLimits.register("ConcurrencyLimit", ConcurrencyLimit)
+SharedLimits.register("HostPoliteness", HostPoliteness)
+
+
+def run_worker(worker_id, events, key_buckets, llm_concurrency, politeness):
+    import scanjob
+
+    def emit(event, data, to=None):
+        events.put((event, data, to))
+
+    def push_metrics():
+        while True:
+            time.sleep(METRICS_PUSH_INTERVAL)
+            events.put((METRICS_EVENT, metrics.drain(), None))
+
+    threading.Thread(target=push_metrics, daemon=True).start()
+    scanjob.init_services(emit, key_buckets=key_buckets, llm_concurrency=llm_concurrency, politeness=politeness)
+    jobs = JobQueue(max_running_per_user=MAX_RUNNING_PER_USER)
+    print(f"👷 {worker_id} ready")
+
+    while True:
+        job = jobs.claim(worker_id)
+        if not job:
+            time.sleep(WORKER_POLL_INTERVAL)
+            continue
+
+        print(f"👷 {worker_id} picked up job {job['id']} for {job['url']}")
+        try:
+            scanjob.process_scan_and_summarize(
+                job["url"], job["user_id"], job["sid"], job.get("resume_scan_id"), job.get("incremental", True),
+                job.get("budget"), on_scan_created=lambda scan_id: jobs.set_scan_id(job["id"], scan_id),
+            )
+            jobs.finish(job["id"])
+        except Exception as e:
+            print(f"❌ Job {job['id']} failed: {e}")
+            jobs.finish(job["id"], "failed")
+
+
+class ScanWorkerPool:
+    # Scans run in separate processes that claim jobs from the shared
+    # JobQueue, so concurrent users no longer share one interpreter's GIL.
+    # Workers send (event, data, sid) tuples back over a queue and
+    # relay_events() re-emits them from the web process, folding metric
+    # deltas into the web process's registry along the way. monitor()
+    # replaces workers that die mid-scan and requeues (or fails) their jobs.
+
+    def __init__(self, processes, emit):
+        self.processes = processes
+        self.emit = emit
+        self.queue = JobQueue(max_running_per_user=MAX_RUNNING_PER_USER)
+        self.context = multiprocessing.get_context("spawn")
+        self.events = self.context.Queue()
+        self.limits = SharedLimits(ctx=self.context)
+        self.key_buckets = None
+        self.llm_concurrency = None
+        self.politeness = None
+        self.workers = {}
+
+    def start(self):
+        requeued = self.queue.requeue_running()
+        if requeued:
+            print(f"🔁 Requeued {len(requeued)} interrupted scan job(s)")
+
+        self.limits.start()
+        self.key_buckets = self.limits.KeyBuckets(
+            [requests_per_minute for _, requests_per_minute in parse_keys(GEMINI_KEYS)]
+        )
+        self.llm_concurrency = self.limits.ConcurrencyLimit(LLM_MAX_CONCURRENCY)
+        self.politeness = self.limits.HostPoliteness()
+        for i in range(self.processes):
+            self.spawn(f"worker-{os.getpid()}-{i}")
+
+    def spawn(self, worker_id):
+        worker = self.context.Process(
+            target=run_worker,
+            args=(worker_id, self.events, self.key_buckets, self.llm_concurrency, self.politeness),
+            daemon=True,
+        )
+        worker.start()
+        self.workers[worker_id] = worker
+
+    def monitor(self):
+        while True:
+            time.sleep(WORKER_MONITOR_INTERVAL)
+            for worker_id, worker in list(self.workers.items()):
+                if worker.is_alive():
+                    continue
+                print(f"💀 {worker_id} exited with code {worker.exitcode}, restarting")
+                self.llm_concurrency.release_owner(worker.pid)
+                metrics.inc("guardex_scan_worker_restarts_total")
+                for job_id, sid, status in self.queue.requeue_running(worker_id):
+                    if status == "failed":
+                        message = "❌ Scan failed: the scan worker crashed repeatedly."
+                    else:
+                        message = "🔁 Scan worker crashed, your scan was requeued and will resume."
+                    print(f"🔁 Job {job_id} {status} after {worker_id} died")
+                    self.emit("scan_update", {"message": message}, to=sid)
+                self.spawn(worker_id)
+
+    def submit(self, user_id, sid, payload):
+        job_id = self.queue.enqueue(user_id, sid, {**payload, "user_id": user_id})
+        return self.queue.position(job_id)
+
+    def relay_events(self):
+        while True:
+            event, data, sid = self.events.get()
+            if event == METRICS_EVENT:
+                metrics.merge(data)
+                continue
+            self.emit(event, data, to=sid)